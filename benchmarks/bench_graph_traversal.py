@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sys, time, random, argparse
+from array import array
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+import graph_analysis as ga
+
+def make_edges(nodes:int,degree:int,seed:int=1)->tuple:
+    """
+    A chain through all nodes, so everything is reachable from 0, plus
+    random edges up to an average out degree of @degree.
+    """
+    rnd = random.Random(seed)
+    src = array("i",range(nodes-1))
+    dst = array("i",range(1,nodes))
+    for _ in range(nodes*(degree-1)):
+        src.append(rnd.randrange(nodes))
+        dst.append(rnd.randrange(nodes))
+    return src, dst
+
+def timed(walk_cb)->tuple:
+    start = time.perf_counter()
+    count = sum(1 for _ in walk_cb())
+    return count, time.perf_counter()-start
+
+def main():
+    parser=argparse.ArgumentParser(description="Compare the graph traversal engine with the former walker.")
+    parser.add_argument("--nodes","-n",action="store",dest="nodes",type=int,nargs="+",
+            help="Graph sizes to measure.",default=[10**3,10**4,10**5,10**6])
+    parser.add_argument("--degree","-d",action="store",dest="degree",type=int,
+            help="Average out degree.",default=4)
+    parser.add_argument("--legacy-max",action="store",dest="legacy_max",type=int,
+            help="Largest graph the former list.pop(0) walker is run on.",default=10**5)
+    given_args = parser.parse_args()
+
+    for nodes in given_args.nodes:
+        src, dst = make_edges(nodes,given_args.degree)
+        graph = ga.DiGraph()
+        for a, b in zip(src,dst):
+            graph.add_edge(a,b)
+        csr = ga.CSRGraph.from_arrays(nodes,src,dst)
+        rows = list()
+        if nodes <= given_args.legacy_max:
+            rows.append(("legacy bfs",timed(lambda:graph._walk_generic_first(0,0,graph.successors_iter))))
+            rows.append(("legacy dfs",timed(lambda:graph._walk_generic_first(0,-1,graph.successors_iter))))
+        rows.append(("bfs",timed(lambda:graph.walk_breadth_first_forward(0))))
+        rows.append(("dfs",timed(lambda:graph.walk_depth_first_forward(0))))
+        rows.append(("csr bfs",timed(lambda:csr.walk_breadth_first_forward(0))))
+        rows.append(("csr dfs",timed(lambda:csr.walk_depth_first_forward(0))))
+        rows.append(("rpo",timed(lambda:graph.reverse_postorder(0))))
+        graph.add_edge(nodes,nodes+1)
+        rows.append(("cached rpo",timed(lambda:graph.reverse_postorder(0))))
+        rows.append(("csr rpo",timed(lambda:csr.reverse_postorder(0))))
+        rows.append(("csr dom",timed(lambda:csr.dominator_tree(0).items())))
+        rows.append(("csr pdom",timed(lambda:csr.post_dominator_tree(nodes-1).items())))
+        rows.append(("csr scc",timed(lambda:(j for comp in csr.strongly_connected_components() for j in comp))))
+        for name, (count, elapsed) in rows:
+            print("nodes={:<8} {:<11}: {:>8.3f}s {:>12,.0f} nodes/s  visited={}".format(
+                nodes,name,elapsed,count/elapsed,count))
+
+if __name__ == "__main__":
+    main()
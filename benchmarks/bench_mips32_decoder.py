@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sys, time, ctypes, random, argparse
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+import mips32_disassembler as md
+
+def gen_words(count:int,seed:int=1)->list:
+    """
+    Random words restricted to encodings the legacy decoder can format.
+    """
+    rnd = random.Random(seed)
+    words = list()
+    while len(words) < count:
+        word = rnd.getrandbits(32)
+        try:
+            md.mips_disass(ctypes.c_uint32(word))
+        except Exception:
+            continue
+        words.append(word)
+    return words
+
+def check_parity(words:list)->int:
+    mismatches = 0
+    for word in words:
+        if md.mips_disass(ctypes.c_uint32(word)) != md.mips_decode(word):
+            mismatches += 1
+    return mismatches
+
+def bench(words:list)->None:
+    start = time.perf_counter()
+    for word in words:
+        md.mips_disass(ctypes.c_uint32(word))
+    legacy = time.perf_counter()-start
+    start = time.perf_counter()
+    for word in words:
+        md.mips_decode(word)
+    table = time.perf_counter()-start
+    print("mips_disass : {:>12,.0f} words/s".format(len(words)/legacy))
+    print("mips_decode : {:>12,.0f} words/s".format(len(words)/table))
+    print("speedup     : {:.1f}x".format(legacy/table))
+
+def main():
+    parser=argparse.ArgumentParser(description="Benchmark the MIPS32 decoders.")
+    parser.add_argument("--words","-n",action="store",dest="words",type=int,
+            help="Number of words to decode.",default=200000)
+    given_args = parser.parse_args()
+    words = gen_words(given_args.words)
+    mismatches = check_parity(words)
+    print("[*] parity: {} mismatches over {} words".format(mismatches,len(words)))
+    bench(words)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sys, time, shutil, argparse, tempfile
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+import mips32_emulator as me
+
+PROGRAM = """
+.text
+.globl main
+main:
+li $s0, 0
+li $t0, 1
+li $t1, {n}
+loop:
+addu $s0, $s0, $t0
+addiu $t0, $t0, 1
+ble $t0, $t1, loop
+move $s1, $t0
+li $v0, 10
+syscall
+"""
+
+# sw patches the next instruction of the same block to li $s0, 0x63
+SELF_MODIFYING = """
+.text
+.globl main
+main:
+la $t0, patch
+li $t1, 0x24100063
+sw $t1, 0($t0)
+patch:
+li $s0, 1
+li $v0, 10
+syscall
+"""
+
+REGISTERS = ["$s0","$s1","$s2","$s3","$s4"]
+
+def run_backend(cls:type,file_name:str,runs:int)->float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        emul = cls(db=False)
+        emul.load_file(file_name)
+        emul.run_spim()
+        for register in REGISTERS:
+            emul.reg_eval(register)
+        emul.quit_prog()
+    return (time.perf_counter()-start)/runs
+
+def run_translation(file_name:str,translate:bool,profile:bool=False)->dict:
+    emul = me.NativeEmulating(db=False,translate=translate,profile=profile)
+    emul.load_file(file_name)
+    emul.run_spim(timeout=None)
+    return emul.stats()
+
+def check_self_modifying(file_name:str)->bool:
+    """
+    Translated and plain runs of a program rewriting its own running
+    block must end with the same registers.
+    """
+    dumps = list()
+    for translate in (False,True):
+        emul = me.NativeEmulating(db=False,translate=translate)
+        emul.load_file(file_name)
+        emul.run_spim(timeout=None)
+        dumps.append(emul.reg_dump())
+    return dumps[0] == dumps[1]
+
+def run_variants(file_name:str,variants:int)->float:
+    """
+    Runs the loop once per variant from a checkpoint taken at main,
+    changing the bound in $t1 every time.
+    """
+    emul = me.NativeEmulating(db=False)
+    emul.load_file(file_name)
+    emul.run_to("loop")
+    snap = emul.checkpoint()
+    start = time.perf_counter()
+    for i in range(variants):
+        emul.restore(snap)
+        emul.machine.regs[9] = i % 100
+        emul.run_spim(timeout=None)
+    return variants/(time.perf_counter()-start)
+
+def main():
+    parser=argparse.ArgumentParser(description="Compare the native and spim emulator backends.")
+    parser.add_argument("--iterations","-n",action="store",dest="iterations",type=int,
+            help="Loop iterations of the test program.",default=100)
+    parser.add_argument("--runs","-r",action="store",dest="runs",type=int,
+            help="Number of load/run/read cycles per backend.",default=20)
+    parser.add_argument("--loop","-l",action="store",dest="loop",type=int,
+            help="Loop iterations of the translation cache comparison.",default=200000)
+    parser.add_argument("--variants","-v",action="store",dest="variants",type=int,
+            help="Runs restored from one checkpoint.",default=2000)
+    given_args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = os.path.join(tmp,"loop.s")
+        with open(file_name,"w") as fd:
+            fd.write(PROGRAM.format(n=given_args.iterations))
+        loop_file = os.path.join(tmp,"hot_loop.s")
+        with open(loop_file,"w") as fd:
+            fd.write(PROGRAM.format(n=given_args.loop))
+        smc_file = os.path.join(tmp,"self_modifying.s")
+        with open(smc_file,"w") as fd:
+            fd.write(SELF_MODIFYING)
+        same = check_self_modifying(smc_file)
+        print("[*] self-modifying code: translated run {}".format(
+            "matches" if same else "DIFFERS from the plain run"))
+        if not same:
+            sys.exit(-1)
+        for translate in (False,True):
+            stats = run_translation(loop_file,translate)
+            print("translate={:<5}: {:>12,.0f} instr/s  blocks={} hits={}".format(
+                str(translate),stats["ips"],stats["blocks_translated"],stats["block_hits"]))
+        stats = run_translation(loop_file,False,True)
+        print("profiled       : {:>12,.0f} instr/s".format(stats["ips"]))
+        print("restore: {:>12,.0f} runs/s from one checkpoint".format(
+            run_variants(file_name,given_args.variants)))
+        native = run_backend(me.NativeEmulating,file_name,given_args.runs)
+        print("native : {:10.3f} ms per program".format(native*1000))
+        if shutil.which("spim") is None or me.pexpect is None:
+            print("spim   : not available, skipped")
+            return
+        spim = run_backend(me.Emulating,file_name,given_args.runs)
+        print("spim   : {:10.3f} ms per program".format(spim*1000))
+        print("speedup: {:.1f}x".format(spim/native))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sys, time, random, struct, argparse, tempfile
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+import mips32_disassembler as md
+
+def make_image(path:str,count:int,seed:int=1)->None:
+    rnd = random.Random(seed)
+    with open(path,"wb") as fd:
+        for start in range(0,count,1 << 16):
+            n = min(1 << 16,count-start)
+            fd.write(struct.pack("<{}I".format(n),*(rnd.getrandbits(32) for _ in range(n))))
+
+def main():
+    parser=argparse.ArgumentParser(description="Scaling benchmark of the parallel MIPS32 disassembler.")
+    parser.add_argument("--words","-n",action="store",dest="words",type=int,
+            help="Number of words in the generated image.",default=1 << 21)
+    parser.add_argument("--jobs","-j",action="store",dest="jobs",type=int,nargs="+",
+            help="Worker counts to measure.",default=[1,2,4,8])
+    given_args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image = os.path.join(tmp,"image.bin")
+        make_image(image,given_args.words)
+        ref = os.path.join(tmp,"serial.s")
+        start = time.perf_counter()
+        md.read_input_and_save_stream(image,ref)
+        elapsed = time.perf_counter()-start
+        print("serial   : {:>12,.0f} words/s".format(given_args.words/elapsed))
+        with open(ref,"rb") as fd:
+            expected = fd.read()
+        for jobs in given_args.jobs:
+            out = os.path.join(tmp,"jobs{}.s".format(jobs))
+            start = time.perf_counter()
+            md.read_input_and_save_parallel(image,out,jobs)
+            elapsed = time.perf_counter()-start
+            with open(out,"rb") as fd:
+                same = fd.read() == expected
+            print("jobs={:<3} : {:>12,.0f} words/s  identical={}".format(
+                jobs,given_args.words/elapsed,same))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, sys, json, random, struct, argparse, tempfile
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+import x86_32_PE_parser as pp
+
+SECTION_RVA = 0x1000
+SECTION_RAW = 0x200
+
+def make_pe(hint_rva:int=0x1080,bound_refs:int=0)->bytes:
+    """
+    Minimal PE32 with one .idata section importing two functions of
+    kernel32.dll. @hint_rva moves the hint of the second import,
+    @bound_refs adds a bound import descriptor claiming that many
+    forwarder refs in an 8 byte directory.
+    """
+    image = bytearray(SECTION_RAW+0x200)
+    image[0:2] = pp.DOS_MAGIC
+    struct.pack_into("<I",image,0x3c,0x40)
+    image[0x40:0x44] = pp.PE_SIGNATURE
+    opt_size = pp.OPT_HDR32.size+16*pp.DATA_DIR.size
+    pp.FILE_HDR.pack_into(image,0x44,0x14c,1,0,0,0,opt_size,0x102)
+    pp.OPT_HDR32.pack_into(image,0x58,pp.PE32_MAGIC,14,0,0,0x200,0,SECTION_RVA,SECTION_RVA,0,
+            0x400000,0x1000,0x200,4,0,0,0,4,0,0,0x2000,SECTION_RAW,0,3,0,
+            0x100000,0x1000,0x100000,0x1000,0,16)
+    dirs = 0x58+pp.OPT_HDR32.size
+    pp.DATA_DIR.pack_into(image,dirs+pp.DIR_IMPORT*8,SECTION_RVA,40)
+    if bound_refs:
+        pp.DATA_DIR.pack_into(image,dirs+pp.DIR_BOUND_IMPORT*8,0x10a0,8)
+    pp.SEC_HDR.pack_into(image,dirs+16*8,b".idata",0x200,SECTION_RVA,0x200,SECTION_RAW,
+            0,0,0,0,0xc0000040)
+
+    def put(rva:int,data:bytes)->None:
+        offset = SECTION_RAW+rva-SECTION_RVA
+        image[offset:offset+len(data)] = data
+
+    put(0x1000,pp.IMPORT_DESC.pack(0x1028,0,0,0x1060,0x1040))
+    put(0x1028,struct.pack("<III",0x1070,hint_rva,0))
+    put(0x1040,struct.pack("<III",0x1070,hint_rva,0))
+    put(0x1060,b"kernel32.dll\0")
+    put(0x1070,b"\0\0ExitProcess\0")
+    put(0x1080,b"\1\0GetTickCount\0")
+    put(0x10a0,pp.BOUND_DESC.pack(0,0x60,bound_refs))
+    return bytes(image)
+
+def make_corpus(path:str,fuzzed:int,seed:int=1)->dict:
+    """
+    Writes the regression corpus to @path.
+    :return: file name -> expected outcome ("ok", "error", "import_error"
+    or None when fuzzed and anything but a crash is fine)
+    """
+    rnd = random.Random(seed)
+    valid = make_pe()
+    corpus = {"valid.exe":(valid,"ok"),
+        "empty.exe":(b"","error"),
+        "dos_only.exe":(valid[:0x30],"error"),
+        "no_sections.exe":(valid[:0x150],"error"),
+        "hint_at_section_end.exe":(make_pe(hint_rva=SECTION_RVA+0x1ff),"import_error"),
+        "bound_refs_overrun.exe":(make_pe(bound_refs=5),"ok")}
+    for i in range(fuzzed):
+        data = bytearray(valid)
+        for _ in range(rnd.randint(1,16)):
+            data[rnd.randrange(len(data))] = rnd.randrange(256)
+        if rnd.random() < 0.3:
+            data = data[:rnd.randrange(0x40,len(data))]
+        corpus["fuzzed_{:04}.exe".format(i)] = (bytes(data),None)
+    expected = {}
+    for name, (data, outcome) in corpus.items():
+        with open(os.path.join(path,name),"wb") as fd:
+            fd.write(data)
+        expected[os.path.join(path,name)] = outcome
+    return expected
+
+def check_records(out_file:str,expected:dict)->int:
+    """
+    :return: number of files whose record does not match @expected
+    """
+    mismatches = 0
+    with open(out_file,"r") as fd:
+        records = {record["file"]:record for record in map(json.loads,fd)}
+    for fname, outcome in expected.items():
+        record = records.get(fname)
+        if record is None:
+            got = "missing"
+        elif record["error"] is not None:
+            got = "error"
+        elif record.get("import_error") is not None:
+            got = "import_error"
+        else:
+            got = "ok"
+        if got == "missing" or (outcome is not None and got != outcome):
+            mismatches += 1
+            print("[-] {}: expected {}, got {}".format(os.path.basename(fname),outcome,got))
+    return mismatches
+
+def main():
+    parser=argparse.ArgumentParser(description="Triage a corpus of broken PE files and check every file gets its record.")
+    parser.add_argument("--fuzzed","-n",action="store",dest="fuzzed",type=int,
+            help="Number of fuzzed files in the corpus.",default=500)
+    parser.add_argument("--jobs","-j",action="store",dest="jobs",type=int,
+            help="Worker processes.",default=2)
+    given_args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp,"corpus")
+        os.mkdir(corpus)
+        expected = make_corpus(corpus,given_args.fuzzed)
+        out_file = os.path.join(tmp,"out.jsonl")
+        stderr, sys.stderr = sys.stderr, open(os.devnull,"w")
+        try:
+            stats = pp.triage(sorted(expected),out_file,given_args.jobs,cache=None)
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+        mismatches = check_records(out_file,expected)
+        print("[*] corpus: {} files, {} errors, {} mismatches".format(
+            stats["files"],stats["errors"],mismatches))
+        print("triage : {:>12,.0f} files/s".format(stats["files_per_s"]))
+        if mismatches:
+            sys.exit(-1)
+
+if __name__ == "__main__":
+    main()
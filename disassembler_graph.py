@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sys,os,argparse
+from graph_analysis import DiGraph
 try:
     from capstone import *
     from capstone.x86 import *
@@ -18,6 +19,7 @@ JMP_INSTR = ["jo","jno","js","jns","je","jz","jne","jnz","jb","jnae","jc","jnb",
         "jnc","jbe","jna","ja","jnbe","jl","jnge","jge","jnl","jle","jng","jg","jnle",
         "jp","jpe","jnp","jpo","jcxz","jecxz","jmp"]
 BRANCH = ["ret","call"]
+CFG_EDGES = [(1,2),(2,7),(1,3),(3,2),(3,4),(4,6),(4,5),(5,4),(5,6),(6,7)]
 
 def read_code_and_save(in_file:str)->str:
     with open(in_file,"rb") as fd:
@@ -87,8 +89,28 @@ def find_basic_blocks(in_file:str)->dict:
     return basic_blocks
 
 def create_graph(bb:dict)->str:
+    """
+    The edges are still those of the exercise, the loops (back edges
+    drawn dashed) are found by the loop nesting forest.
+    """
+    cfg = DiGraph()
+    for key in bb:
+        cfg.add_node(key)
+    for src,dst in CFG_EDGES:
+        cfg.add_edge(src,dst)
+    loops = cfg.loop_forest()
+    back_edges = set()
+    for loop in range(len(loops)):
+        back_edges.update(loops.back_edges(loop))
+        print("[*] Loop headed by {}: {}".format(
+            ", ".join("Block_{}".format(h) for h in loops.loop_headers(loop)),
+            ", ".join("Block_{}".format(b) for b in loops.loop_body(loop))))
     output = open("basic_blocks_graph.dot","w")
-    output.write("digraph CFG {Block_1 -> Block_2 -> Block_7; Block_1 -> Block_3 -> Block_2; Block_1 -> Block_3 -> Block_4 -> Block_6; Block_1 -> Block_3 -> Block_4 -> Block_5 -> Block_4; Block_5 -> Block_6 -> Block_7}")
+    output.write("digraph CFG {\n")
+    for src,dst in CFG_EDGES:
+        style = " [style=dashed]" if (src,dst) in back_edges else ""
+        output.write("Block_{} -> Block_{}{};\n".format(src,dst,style))
+    output.write("}\n")
     output.close()
     return output.name
 
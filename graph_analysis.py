@@ -1,6 +1,472 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from array import array
+from collections import deque
+# numpy is optional, CSRGraph falls back to a counting sort without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# event kinds of dfs()
+PRE, POST = 0, 1
+
+def bfs(head, successors, stop=None):
+    """
+    Breadth first walk from @head in O(V+E). Nodes are marked when they
+    are queued, so every node enters the queue once.
+    @successors: returns the next nodes of a node
+    @stop: optional predicate, the walk ends after the first node
+    for which it is true
+    :return: next node
+    """
+    done = {head}
+    todo = deque([head])
+    while todo:
+        node = todo.popleft()
+        yield node
+        if stop is not None and stop(node):
+            return
+        for successor in successors(node):
+            if successor not in done:
+                done.add(successor)
+                todo.append(successor)
+
+def dfs(head, successors, reverse=False):
+    """
+    Iterative depth first walk from @head without recursion limits.
+    @successors: returns the next nodes of a node, as a sequence
+    if @reverse is set
+    @reverse: explore the successors of a node last to first
+    :return: (PRE, node) when a node is entered and (POST, node) when
+    all its successors are done
+    """
+    done = {head}
+    yield PRE, head
+    nexts = successors(head)
+    stack = [(head, reversed(nexts) if reverse else iter(nexts))]
+    while stack:
+        node, todo = stack[-1]
+        for successor in todo:
+            if successor not in done:
+                done.add(successor)
+                yield PRE, successor
+                nexts = successors(successor)
+                stack.append((successor, reversed(nexts) if reverse else iter(nexts)))
+                break
+        else:
+            stack.pop()
+            yield POST, node
+
+def bfs_ids(offsets, targets, head, stop=None):
+    """
+    bfs() over dense ids of CSR arrays.
+    """
+    done = bytearray(len(offsets)-1)
+    done[head] = 1
+    todo = deque([head])
+    while todo:
+        node = todo.popleft()
+        yield node
+        if stop is not None and stop(node):
+            return
+        for successor in targets[offsets[node]:offsets[node+1]]:
+            if not done[successor]:
+                done[successor] = 1
+                todo.append(successor)
+
+def dfs_ids(offsets, targets, head, reverse=False):
+    """
+    dfs() over dense ids of CSR arrays. The stack holds the id and the
+    position of the next edge to look at.
+    """
+    done = bytearray(len(offsets)-1)
+    done[head] = 1
+    yield PRE, head
+    step = -1 if reverse else 1
+    stack = [head]
+    pos = [offsets[head+1]-1 if reverse else offsets[head]]
+    while stack:
+        node = stack[-1]
+        k = pos[-1]
+        low, high = offsets[node], offsets[node+1]
+        while low <= k < high and done[targets[k]]:
+            k += step
+        if low <= k < high:
+            successor = targets[k]
+            pos[-1] = k+step
+            done[successor] = 1
+            yield PRE, successor
+            stack.append(successor)
+            pos.append(offsets[successor+1]-1 if reverse else offsets[successor])
+        else:
+            stack.pop()
+            pos.pop()
+            yield POST, node
+
+def immediate_dominators(succ_offsets, succ_targets, pred_offsets, pred_targets, head):
+    """
+    Cooper, Harvey and Kennedy's iterative algorithm over reverse
+    postorder on CSR arrays. Converges in a few passes on real CFGs,
+    including irreducible ones.
+    :return: array of the immediate dominator id of every id, -1 if
+    not reachable from @head, @head for @head itself
+    """
+    order = [j for kind, j in dfs_ids(succ_offsets, succ_targets, head) if kind == POST]
+    order.reverse()
+    n = len(succ_offsets)-1
+    # plain lists in the hot loop, array items are boxed on every read
+    rpo = [-1]*n
+    for k, j in enumerate(order):
+        rpo[j] = k
+    preds = [pred_targets[pred_offsets[b]:pred_offsets[b+1]] for b in order]
+    idom = [-1]*n
+    idom[head] = head
+    changed = True
+    while changed:
+        changed = False
+        for k in range(1, len(order)):
+            b = order[k]
+            new = -1
+            for p in preds[k]:
+                if idom[p] == -1:
+                    continue
+                if new == -1:
+                    new = p
+                    continue
+                # intersect: walk both fingers up to the common dominator
+                a = p
+                while a != new:
+                    while rpo[a] > rpo[new]:
+                        a = idom[a]
+                    while rpo[new] > rpo[a]:
+                        new = idom[new]
+            if idom[b] != new:
+                idom[b] = new
+                changed = True
+    return array("i", idom)
+
+def dominance_frontiers(pred_offsets, pred_targets, idom):
+    """
+    Dominance frontier of every id, as CSR (offsets, targets) arrays.
+    """
+    n = len(idom)
+    frontier = [None]*n
+    for b in range(n):
+        if idom[b] == -1:
+            continue
+        # the root has an implicit entry edge, so one back edge makes it a join
+        stop = -1 if idom[b] == b else idom[b]
+        if stop != -1 and pred_offsets[b+1]-pred_offsets[b] < 2:
+            continue
+        for p in pred_targets[pred_offsets[b]:pred_offsets[b+1]]:
+            runner = p if idom[p] != -1 else stop
+            while runner != stop:
+                if frontier[runner] is None:
+                    frontier[runner] = []
+                if not frontier[runner] or frontier[runner][-1] != b:
+                    frontier[runner].append(b)
+                if idom[runner] == runner:
+                    break
+                runner = idom[runner]
+    offsets = array("q", [0])*(n+1)
+    targets = array("i")
+    for b in range(n):
+        if frontier[b] is not None:
+            targets.extend(frontier[b])
+        offsets[b+1] = len(targets)
+    return offsets, targets
+
+class DominatorTree:
+    """
+    Dominator (or post-dominator) tree as a parent array over dense ids.
+    @idom[i] is the immediate dominator of id i, -1 if unreachable.
+    Ids beyond the graph's nodes are virtual (the common exit of
+    post-dominators) and map to None.
+    """
+
+    def __init__(self, labels, node_id, idom, root, pred_offsets, pred_targets):
+        self.labels = labels
+        self.node_id = node_id
+        self.idom = idom
+        self.root = root
+        self._preds = (pred_offsets, pred_targets)
+        self._frontiers = None
+        self._intervals = None
+
+    def _label(self, i):
+        return self.labels[i] if 0 <= i < len(self.labels) else None
+
+    def immediate_dominator(self, node):
+        """
+        :return: parent of @node in the tree, None for the root,
+        unreachable nodes and the virtual exit
+        """
+        i = self.node_id(node)
+        if i is None or self.idom[i] in (-1, i):
+            return None
+        return self._label(self.idom[i])
+
+    def _build_intervals(self):
+        n = len(self.idom)
+        children = [[] for _ in range(n)]
+        for i in range(n):
+            if self.idom[i] != -1 and self.idom[i] != i:
+                children[self.idom[i]].append(i)
+        enter = array("i", [-1])*n
+        leave = array("i", [-1])*n
+        clock = 0
+        stack = [(self.root, iter(children[self.root]))]
+        enter[self.root] = clock
+        while stack:
+            node, todo = stack[-1]
+            child = next(todo, None)
+            if child is None:
+                stack.pop()
+                clock += 1
+                leave[node] = clock
+            else:
+                clock += 1
+                enter[child] = clock
+                stack.append((child, iter(children[child])))
+        self._intervals = (enter, leave)
+
+    def dominates(self, a, b):
+        """
+        True if @a dominates @b (every node dominates itself). O(1)
+        after one walk over the tree.
+        """
+        i, j = self.node_id(a), self.node_id(b)
+        if i is None or j is None or self.idom[i] == -1 or self.idom[j] == -1:
+            return False
+        if self._intervals is None:
+            self._build_intervals()
+        enter, leave = self._intervals
+        return enter[i] <= enter[j] and leave[j] <= leave[i]
+
+    def frontier(self, node):
+        """
+        Dominance frontier of @node.
+        """
+        if self._frontiers is None:
+            self._frontiers = dominance_frontiers(self._preds[0], self._preds[1], self.idom)
+        i = self.node_id(node)
+        if i is None:
+            return []
+        offsets, targets = self._frontiers
+        return [self._label(j) for j in targets[offsets[i]:offsets[i+1]]]
+
+    def items(self):
+        """
+        (node, immediate dominator) of every reachable node
+        """
+        for i, parent in enumerate(self.idom):
+            if parent != -1 and i < len(self.labels):
+                yield self.labels[i], None if parent == i else self._label(parent)
+
+def _tarjan(offsets, targets, roots, region=None, tag=-1, cut=None, num=None):
+    """
+    Iterative Tarjan over the ids in @roots. With @region only ids
+    where region[j] == @tag are visited, edges into ids marked in @cut
+    are ignored. @num is a scratch list of -1, one per id, handed back
+    reset so that nested passes do not pay for the whole graph again.
+    :return: list of components (lists of ids), in reverse topological order
+    """
+    if num is None:
+        num = [-1]*(len(offsets)-1)
+    low = {}
+    stack = []
+    on_stack = set()
+    comps = []
+    count = 0
+    for root in roots:
+        if num[root] != -1:
+            continue
+        num[root] = low[root] = count
+        count += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, offsets[root])]
+        while work:
+            v, k = work[-1]
+            end = offsets[v+1]
+            while k < end:
+                w = targets[k]
+                k += 1
+                if region is not None and (region[w] != tag or cut[w]):
+                    continue
+                if num[w] == -1:
+                    work[-1] = (v, k)
+                    num[w] = low[w] = count
+                    count += 1
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, offsets[w]))
+                    break
+                if w in on_stack and num[w] < low[v]:
+                    low[v] = num[w]
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+                if low[v] == num[v]:
+                    comp = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        comp.append(w)
+                        if w == v:
+                            break
+                    comps.append(comp)
+    for comp in comps:
+        for v in comp:
+            num[v] = -1
+    return comps
+
+def scc_ids(offsets, targets):
+    """
+    Strongly connected components of a CSR graph.
+    :return: (comp, components): comp[i] is the component of id i,
+    components are numbered in topological order of the condensation
+    """
+    comps = _tarjan(offsets, targets, range(len(offsets)-1))
+    comps.reverse()
+    comp = array("i", [0])*(len(offsets)-1)
+    for c, members in enumerate(comps):
+        for j in members:
+            comp[j] = c
+    return comp, comps
+
+def condense_ids(offsets, targets, comp):
+    """
+    Edges between components, without duplicates and self loops.
+    :return: (src, dst) arrays, ready for CSRGraph.from_arrays()
+    """
+    src = array("i")
+    dst = array("i")
+    seen = set()
+    for i in range(len(offsets)-1):
+        a = comp[i]
+        for j in targets[offsets[i]:offsets[i+1]]:
+            b = comp[j]
+            if a != b and (a, b) not in seen:
+                seen.add((a, b))
+                src.append(a)
+                dst.append(b)
+    return src, dst
+
+class LoopForest:
+    """
+    Loop nesting forest (Steensgaard): every non trivial SCC is a loop,
+    its headers are the nodes entered from outside. Inner loops are the
+    SCCs of the body once the edges into the headers are removed, so
+    irreducible loops get several headers instead of being missed.
+    @loop_of[i]: innermost loop of id i, -1 outside of any loop
+    @parent[l]: enclosing loop of loop l, -1 for outermost loops
+    """
+
+    def __init__(self, labels, node_id, loop_of, parent, headers, bodies, offsets, targets):
+        self.labels = labels
+        self.node_id = node_id
+        self.loop_of = loop_of
+        self.parent = parent
+        self.headers = headers
+        self.bodies = bodies
+        self._succ = (offsets, targets)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def depth(self, node):
+        """
+        Number of loops around @node, 0 outside of any loop
+        """
+        i = self.node_id(node)
+        depth = 0
+        loop = -1 if i is None else self.loop_of[i]
+        while loop != -1:
+            depth += 1
+            loop = self.parent[loop]
+        return depth
+
+    def innermost(self, node):
+        """
+        Innermost loop index of @node, -1 outside of any loop
+        """
+        i = self.node_id(node)
+        return -1 if i is None else self.loop_of[i]
+
+    def loop_headers(self, loop):
+        return [self.labels[i] for i in self.headers[loop]]
+
+    def loop_body(self, loop):
+        """
+        All nodes of @loop, including those of its inner loops
+        """
+        return [self.labels[i] for i in self.bodies[loop]]
+
+    def back_edges(self, loop):
+        """
+        Edges from the body of @loop into one of its headers
+        """
+        offsets, targets = self._succ
+        heads = set(self.headers[loop])
+        return [(self.labels[i], self.labels[j]) for i in self.bodies[loop]
+                for j in targets[offsets[i]:offsets[i+1]] if j in heads]
+
+def loop_forest_ids(offsets, targets, pred_offsets, pred_targets):
+    """
+    :return: (loop_of, parent, headers, bodies) over the ids, see LoopForest
+    """
+    n = len(offsets)-1
+    region = array("i", [-1])*n
+    cut = bytearray(n)
+    parent = array("i")
+    headers = []
+    bodies = []
+    num = [-1]*n
+    inside = bytearray(n)
+    todo = [(-1, range(n))]
+    while todo:
+        outer, members = todo.pop()
+        found = []
+        for comp in _tarjan(offsets, targets, members, region, outer, cut, num):
+            if len(comp) == 1:
+                v = comp[0]
+                if v not in targets[offsets[v]:offsets[v+1]] or cut[v]:
+                    continue
+            for v in comp:
+                inside[v] = 1
+            heads = []
+            for v in comp:
+                for p in pred_targets[pred_offsets[v]:pred_offsets[v+1]]:
+                    if not inside[p]:
+                        heads.append(v)
+                        break
+            for v in comp:
+                inside[v] = 0
+            if not heads:
+                # entered only by the start of the walk, the root of the SCC
+                heads = [comp[-1]]
+            heads.sort()
+            comp.sort()
+            loop = len(parent)
+            parent.append(outer)
+            headers.append(heads)
+            bodies.append(comp)
+            found.append(loop)
+        # relabel after the walk, so that every pass only sees its own body
+        for loop in found:
+            for v in bodies[loop]:
+                region[v] = loop
+            for v in headers[loop]:
+                cut[v] = 1
+            todo.append((loop, bodies[loop]))
+    return region, parent, headers, bodies
+
 class DiGraph:
 
     def __init__(self):
@@ -12,11 +478,25 @@ class DiGraph:
         self.successors = {}
         # predecessors of a node
         self.predecessors = {}
+        self._init_cache()
+
+    def _init_cache(self):
+        # bumped by every change of the graph
+        self.version = 0
+        # (head, backward) -> [nodes reachable from head, {analysis: result}]
+        self._rooted = {}
+        # analyses of the whole graph, dropped by any change
+        self._whole = {}
+        self.cache_stats = {"hits": 0, "misses": 0, "invalidated": 0, "updated": 0}
 
     def add_node(self, node):
+        if node in self.nodes:
+            return
         self.nodes.add(node)
         self.successors[node] = []
         self.predecessors[node] = []
+        # a new node is isolated, rooted results stay valid
+        self._changed(None, None, True)
 
     def add_edge(self, src, dst):
         if not src in self.nodes:
@@ -26,6 +506,100 @@ class DiGraph:
         self.edges.add((src, dst))
         self.successors[src].append(dst)
         self.predecessors[dst].append(src)
+        self._changed(src, dst, True)
+
+    def remove_edge(self, src, dst):
+        if not (src, dst) in self.edges:
+            raise KeyError((src, dst))
+        self.edges.remove((src, dst))
+        self.successors[src] = [node for node in self.successors[src] if node != dst]
+        self.predecessors[dst] = [node for node in self.predecessors[dst] if node != src]
+        self._changed(src, dst, False)
+
+    def _changed(self, src, dst, added):
+        """
+        Drops the cached results an edge change can affect. A rooted
+        result only depends on the edges leaving its reachable set; an
+        added edge extends that set in place, a removed one drops it.
+        """
+        stats = self.cache_stats
+        self.version += 1
+        stats["invalidated"] += len(self._whole)
+        self._whole.clear()
+        if src is None:
+            return
+        for key, (reach, results) in list(self._rooted.items()):
+            head, backward = key
+            near, far = (dst, src) if backward else (src, dst)
+            if not near in reach:
+                continue
+            if not added:
+                stats["invalidated"] += len(results)+1
+                del self._rooted[key]
+                continue
+            stats["invalidated"] += len(results)
+            results.clear()
+            if not far in reach:
+                next_nodes = self._next_nodes(backward)
+                reach.add(far)
+                todo = [far]
+                while todo:
+                    for node in next_nodes(todo.pop()):
+                        if not node in reach:
+                            reach.add(node)
+                            todo.append(node)
+                stats["updated"] += 1
+
+    def _memo(self, name, head, backward, compute, reach_of):
+        """
+        Result of @compute for @head, cached until a change reaches it.
+        @reach_of gives the reachable nodes from the result, so the
+        first analysis from a head does not walk the graph twice.
+        """
+        entry = self._rooted.get((head, backward))
+        if entry is not None and name in entry[1]:
+            self.cache_stats["hits"] += 1
+            return entry[1][name]
+        self.cache_stats["misses"] += 1
+        value = compute()
+        if entry is None:
+            entry = self._rooted[(head, backward)] = [set(reach_of(value)), {}]
+        entry[1][name] = value
+        return value
+
+    def _memo_whole(self, name, compute):
+        if name in self._whole:
+            self.cache_stats["hits"] += 1
+            return self._whole[name]
+        self.cache_stats["misses"] += 1
+        value = self._whole[name] = compute()
+        return value
+
+    def cache_info(self):
+        """
+        Cache statistics, the graph version and the number of cached results
+        """
+        info = dict(self.cache_stats)
+        info["version"] = self.version
+        info["entries"] = len(self._whole)+sum(len(results)+1 for _, results in self._rooted.values())
+        return info
+
+    def _reach(self, head, backward):
+        entry = self._rooted.get((head, backward))
+        if entry is not None:
+            self.cache_stats["hits"] += 1
+            return entry[0]
+        self.cache_stats["misses"] += 1
+        reach = set(self._bfs(head, backward, None))
+        self._rooted[(head, backward)] = [reach, {}]
+        return reach
+
+    def reachable(self, head, backward=False):
+        """Nodes reachable from @head, @head included"""
+        return set(self._reach(head, backward))
+
+    def is_reachable(self, head, node, backward=False):
+        return node in self._reach(head, backward)
 
     def successors_iter(self, node):
         if not node in self.successors:
@@ -47,12 +621,35 @@ class DiGraph:
         return ''.join(ret)
 
     def dump_dot(self, file_path):
-        open(file_path, "wb").write(self.dot())
+        with open(file_path, "w") as fd:
+            fd.write(self.dot())
+
+    def to_csr(self):
+        """
+        Array backed copy of the graph, see CSRGraph.
+        Successor and predecessor order is kept. The copy is cached
+        until the graph changes, do not keep it across changes.
+        """
+        return self._memo_whole("csr", self._build_csr)
+
+    def _build_csr(self):
+        csr = CSRGraph.from_edges(((src, dst) for src in self.successors
+                                   for dst in self.successors[src]), self.nodes)
+        ids = csr.ids
+        keys = array("i")
+        values = array("i")
+        for dst, preds in self.predecessors.items():
+            for src in preds:
+                keys.append(ids[dst])
+                values.append(ids[src])
+        csr.pred_offsets, csr.pred_targets = csr._compress(len(csr.labels), keys, values)
+        return csr
     
     def _walk_generic_first(self, head, flag, successors):
         """
         Generic algorithm to compute BFS/DFS
-        for a node.
+        for a node. Superseded by bfs()/dfs(), which do not queue a node
+        twice; kept for comparison.
         @head: the head of the graph
         @flag: denotes if @todo is used as queue or stack
         @succ_cb: returns a node's predecessors/successors
@@ -72,21 +669,316 @@ class DiGraph:
 
             yield node
 
-    def walk_breadth_first_forward(self, head):
+    def _next_nodes(self, backward):
+        table = self.predecessors if backward else self.successors
+        return lambda node: table.get(node, ())
+
+    def _bfs(self, head, backward, stop):
+        return bfs(head, self._next_nodes(backward), stop)
+
+    def _dfs(self, head, backward, reverse=False):
+        return dfs(head, self._next_nodes(backward), reverse)
+
+    def _dfs_preorder(self, head, backward, stop):
+        # successors last to first gives the same order as the former
+        # stack based walk
+        for kind, node in self._dfs(head, backward, True):
+            if kind == PRE:
+                yield node
+                if stop is not None and stop(node):
+                    return
+
+    def walk_breadth_first_forward(self, head, stop=None):
         """BFS on the graph"""
-        return self._walk_generic_first(head, 0, self.successors_iter)
+        return self._bfs(head, False, stop)
 
-    def walk_depth_first_forward(self, head):
+    def walk_depth_first_forward(self, head, stop=None):
         """DFS on the graph"""
-        return self._walk_generic_first(head, -1, self.successors_iter)
+        return self._dfs_preorder(head, False, stop)
 
-    def walk_breadth_first_backward(self, head):
+    def walk_breadth_first_backward(self, head, stop=None):
         """BFS on the reversed graph"""
-        return self._walk_generic_first(head, 0, self.predecessors_iter)
+        return self._bfs(head, True, stop)
 
-    def walk_depth_first_backward(self, head):
+    def walk_depth_first_backward(self, head, stop=None):
         """DFS on the reversed graph"""
-        return self._walk_generic_first(head, -1, self.predecessors_iter)
+        return self._dfs_preorder(head, True, stop)
+
+    # The orderings and analyses below are cached, see _changed().
+    # Lists are copied out, the analysis objects are shared.
+
+    def preorder(self, head, backward=False):
+        """DFS preorder, successors first to last"""
+        return list(self._memo("preorder", head, backward,
+                               lambda: [node for kind, node in self._dfs(head, backward) if kind == PRE],
+                               lambda order: order))
+
+    def postorder(self, head, backward=False):
+        """DFS postorder, successors first to last"""
+        return list(self._memo("postorder", head, backward,
+                               lambda: [node for kind, node in self._dfs(head, backward) if kind == POST],
+                               lambda order: order))
+
+    def reverse_postorder(self, head, backward=False):
+        """Reverse DFS postorder, a topological order if there is no cycle"""
+        order = self.postorder(head, backward)
+        order.reverse()
+        return order
+
+    def dominator_tree(self, head):
+        """
+        Dominators of all nodes reachable from @head, see DominatorTree.
+        """
+        return self._memo("dominators", head, False,
+                          lambda: self.to_csr().dominator_tree(head),
+                          lambda tree: (node for node, _ in tree.items()))
+
+    def post_dominator_tree(self, tail=None):
+        """
+        Post-dominators: dominators of the reversed graph from @tail, or
+        from a virtual exit joining all nodes without successors.
+        """
+        if tail is None:
+            return self._memo_whole("post_dominators", lambda: self.to_csr().post_dominator_tree())
+        return self._memo("post_dominators", tail, True,
+                          lambda: self.to_csr().post_dominator_tree(tail),
+                          lambda tree: (node for node, _ in tree.items()))
+
+    def strongly_connected_components(self):
+        """
+        Lists of nodes, one per SCC, in topological order of the condensation
+        """
+        return [list(comp) for comp in self._memo_whole(
+            "scc", lambda: self.to_csr().strongly_connected_components())]
+
+    def condensation(self):
+        """
+        :return: (dag, comp): CSRGraph whose nodes are the component
+        numbers 0..k-1, already a topological order, and a dict mapping
+        every node to its component
+        """
+        return self._memo_whole("condensation", lambda: self.to_csr().condensation())
+
+    def loop_forest(self):
+        """
+        Loop nesting forest of the graph, see LoopForest.
+        """
+        return self._memo_whole("loop_forest", lambda: self.to_csr().loop_forest())
+
+class CSRGraph(DiGraph):
+    """
+    Immutable DiGraph stored in compressed sparse row arrays.
+    Nodes are interned to dense ids 0..n-1 (@labels maps them back,
+    graphs built by from_arrays() use the ids themselves as nodes).
+    The successors of id i are
+    succ_targets[succ_offsets[i]:succ_offsets[i+1]], the predecessors
+    are kept the same way in pred_offsets/pred_targets.
+    """
+
+    def __init__(self, labels, src, dst):
+        """
+        @labels: list of nodes, index is the dense id, or range(n)
+        @src, @dst: array('i') of dense ids, one entry per edge
+        """
+        self.labels = labels
+        self.ids = None if isinstance(labels, range) else \
+            {node: i for i, node in enumerate(labels)}
+        self.num_edges = len(src)
+        self.succ_offsets, self.succ_targets = self._compress(len(labels), src, dst)
+        self.pred_offsets, self.pred_targets = self._compress(len(labels), dst, src)
+        self._init_cache()
+
+    @classmethod
+    def from_edges(cls, edges, nodes=()):
+        """
+        Builds the graph from an iterable of (src, dst) pairs in one
+        pass. @nodes adds nodes without edges.
+        """
+        ids = {}
+        labels = []
+        src = array("i")
+        dst = array("i")
+        for node in nodes:
+            if node not in ids:
+                ids[node] = len(labels)
+                labels.append(node)
+        for a, b in edges:
+            i = ids.get(a)
+            if i is None:
+                i = ids[a] = len(labels)
+                labels.append(a)
+            j = ids.get(b)
+            if j is None:
+                j = ids[b] = len(labels)
+                labels.append(b)
+            src.append(i)
+            dst.append(j)
+        return cls(labels, src, dst)
+
+    @classmethod
+    def from_arrays(cls, num_nodes, src, dst):
+        """
+        Builds the graph from two equally long sequences of dense node
+        ids in 0..@num_nodes-1 without any interning.
+        """
+        return cls(range(num_nodes), array("i", src), array("i", dst))
+
+    @staticmethod
+    def _compress(n, keys, values):
+        """
+        Stable counting sort of @values by @keys.
+        :return: (offsets, targets)
+        """
+        if np is not None and len(keys):
+            np_keys = np.frombuffer(keys, dtype=np.int32)
+            order = np.argsort(np_keys, kind="stable")
+            offsets = np.zeros(n+1, dtype=np.int64)
+            np.cumsum(np.bincount(np_keys, minlength=n), out=offsets[1:])
+            targets = np.frombuffer(values, dtype=np.int32)[order]
+            return array("q", offsets.tobytes()), array("i", targets.tobytes())
+        offsets = array("q", bytes(8*(n+1)))
+        for key in keys:
+            offsets[key+1] += 1
+        for i in range(n):
+            offsets[i+1] += offsets[i]
+        pos = offsets[:n]
+        targets = array("i", bytes(4*len(values)))
+        for key, value in zip(keys, values):
+            targets[pos[key]] = value
+            pos[key] += 1
+        return offsets, targets
+
+    def node_id(self, node):
+        """
+        Dense id of @node, None if it is not in the graph.
+        """
+        if self.ids is not None:
+            return self.ids.get(node)
+        if isinstance(node, int) and 0 <= node < len(self.labels):
+            return node
+        return None
+
+    @property
+    def nodes(self):
+        return self.labels if self.ids is None else self.ids.keys()
+
+    @property
+    def edges(self):
+        labels = self.labels
+        offsets, targets = self.succ_offsets, self.succ_targets
+        return ((labels[i], labels[targets[k]]) for i in range(len(labels))
+                for k in range(offsets[i], offsets[i+1]))
+
+    def add_node(self, node):
+        raise TypeError("CSRGraph is immutable, build a new one with from_edges()")
+
+    def remove_edge(self, src, dst):
+        raise TypeError("CSRGraph is immutable, build a new one with from_edges()")
+
+    def to_csr(self):
+        return self
+
+    def add_edge(self, src, dst):
+        raise TypeError("CSRGraph is immutable, build a new one with from_edges()")
+
+    def _arrays(self, backward):
+        if backward:
+            return self.pred_offsets, self.pred_targets
+        return self.succ_offsets, self.succ_targets
+
+    def _bfs(self, head, backward, stop):
+        i = self.node_id(head)
+        if i is None:
+            return iter([head])
+        labels = self.labels
+        offsets, targets = self._arrays(backward)
+        id_stop = None if stop is None else (lambda j: stop(labels[j]))
+        return (labels[j] for j in bfs_ids(offsets, targets, i, id_stop))
+
+    def _dfs(self, head, backward, reverse=False):
+        i = self.node_id(head)
+        if i is None:
+            return iter([(PRE, head), (POST, head)])
+        labels = self.labels
+        offsets, targets = self._arrays(backward)
+        return ((kind, labels[j]) for kind, j in dfs_ids(offsets, targets, i, reverse))
+
+    def dominator_tree(self, head):
+        root = self.node_id(head)
+        if root is None:
+            raise KeyError(head)
+        idom = immediate_dominators(self.succ_offsets, self.succ_targets,
+                                    self.pred_offsets, self.pred_targets, root)
+        return DominatorTree(self.labels, self.node_id, idom, root,
+                             self.pred_offsets, self.pred_targets)
+
+    def post_dominator_tree(self, tail=None):
+        if tail is not None:
+            root = self.node_id(tail)
+            if root is None:
+                raise KeyError(tail)
+            idom = immediate_dominators(self.pred_offsets, self.pred_targets,
+                                        self.succ_offsets, self.succ_targets, root)
+            return DominatorTree(self.labels, self.node_id, idom, root,
+                                 self.succ_offsets, self.succ_targets)
+        # virtual exit with id n, its predecessors in the reversed graph
+        # are the sinks of the graph
+        n = len(self.labels)
+        sinks = [i for i in range(n) if self.succ_offsets[i] == self.succ_offsets[i+1]]
+        fwd_offsets = array("q", self.pred_offsets)
+        fwd_offsets.append(fwd_offsets[-1]+len(sinks))
+        fwd_targets = array("i", self.pred_targets)
+        fwd_targets.extend(sinks)
+        back_offsets = array("q", [0])*(n+2)
+        back_targets = array("i")
+        for i in range(n):
+            if self.succ_offsets[i] == self.succ_offsets[i+1]:
+                back_targets.append(n)
+            else:
+                back_targets.extend(self.succ_targets[self.succ_offsets[i]:self.succ_offsets[i+1]])
+            back_offsets[i+1] = len(back_targets)
+        back_offsets[n+1] = len(back_targets)
+        idom = immediate_dominators(fwd_offsets, fwd_targets, back_offsets, back_targets, n)
+        return DominatorTree(self.labels, self.node_id, idom, n, back_offsets, back_targets)
+
+    def strongly_connected_components(self):
+        labels = self.labels
+        return [[labels[j] for j in members]
+                for members in scc_ids(self.succ_offsets, self.succ_targets)[1]]
+
+    def condensation(self):
+        comp, comps = scc_ids(self.succ_offsets, self.succ_targets)
+        src, dst = condense_ids(self.succ_offsets, self.succ_targets, comp)
+        dag = CSRGraph.from_arrays(len(comps), src, dst)
+        return dag, {node: comp[i] for i, node in enumerate(self.labels)}
+
+    def loop_forest(self):
+        loop_of, parent, headers, bodies = loop_forest_ids(
+            self.succ_offsets, self.succ_targets, self.pred_offsets, self.pred_targets)
+        return LoopForest(self.labels, self.node_id, loop_of, parent, headers, bodies,
+                          self.succ_offsets, self.succ_targets)
+
+    def successor_ids(self, i):
+        return self.succ_targets[self.succ_offsets[i]:self.succ_offsets[i+1]]
+
+    def predecessor_ids(self, i):
+        return self.pred_targets[self.pred_offsets[i]:self.pred_offsets[i+1]]
+
+    def successors_iter(self, node):
+        i = self.node_id(node)
+        if i is None:
+            return
+        labels = self.labels
+        for j in self.succ_targets[self.succ_offsets[i]:self.succ_offsets[i+1]]:
+            yield labels[j]
+
+    def predecessors_iter(self, node):
+        i = self.node_id(node)
+        if i is None:
+            return
+        labels = self.labels
+        for j in self.pred_targets[self.pred_offsets[i]:self.pred_offsets[i+1]]:
+            yield labels[j]
 
 edges = [
     (1, 2),
@@ -127,13 +1019,13 @@ edges = [
     (19, 7),
 ]
 
-g = DiGraph()
-
-for a, b in edges:
-    g.add_edge(a, b)
+if __name__ == "__main__":
+    g = DiGraph()
 
-for node in g.walk_breadth_first_forward(1):
-    print(node)
+    for a, b in edges:
+        g.add_edge(a, b)
 
+    for node in g.walk_breadth_first_forward(1):
+        print(node)
 
-g.dump_dot("/tmp/foo.dot")
+    g.dump_dot("/tmp/foo.dot")
@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import ctypes, struct, os, sys, argparse
+import ctypes, struct, mmap, os, sys, argparse
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+# numpy is optional (python3 -m pip install numpy): only --bulk and the
+# columnar decoder need it, everything else is pure Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 REGISTERS_DICT = {
         0:"$zero", #Hardware constant 0
@@ -85,7 +93,7 @@ R_TYPE_LSTR_GTE = 4
 def bit_mask(n:int)->int:
     return (1 << n)-1
 
-def mips_disass(num:ctypes.c_uint32)->str:
+def mips_disass(num:ctypes.c_uint32,verbose:bool=False)->str:
     op_code = ctypes.c_uint8(num.value >> 26)
     op_code_u = ctypes.c_uint8((op_code.value >> 3) & bit_mask(3))
     op_code_l = ctypes.c_uint8(op_code.value & bit_mask(3))
@@ -103,7 +111,7 @@ def mips_disass(num:ctypes.c_uint32)->str:
     func_code_u = ctypes.c_uint8((func_code.value >> 3) & bit_mask(3))
     func_code_l = ctypes.c_uint8(func_code.value & bit_mask(3))
 
-    imm = ctypes.c_uint8(num.value & bit_mask(16)) #immediate value
+    imm = ctypes.c_uint16(num.value & bit_mask(16)) #immediate value
     tgt = ctypes.c_uint32(num.value & bit_mask(26)) #target of branch locus
     instr_dict = {'name':None,'type':None,'args':[None]*32}
 
@@ -147,20 +155,18 @@ def mips_disass(num:ctypes.c_uint32)->str:
                 instr_dict[key] = "nop"
                 #print(instr_dict[key])
             if key == "args":
-                instr_dict[key][0] = 0
+                instr_dict[key] = ""
     elif(op_code.value == 0):
         if func_code_u.value == REG_TYPE_SHIFT_OR_SHIFTV:
             if(func_code_l.value < 4):
                 instr_dict["args"]="{}, {}, {}".format(
                     REGISTERS_DICT[rd.value],REGISTERS_DICT[rt.value],sa.value
                     )
-                print(instr_dict["name"]+" "+instr_dict["args"])
             else:
                 instr_dict["args"]="{}, {}, {}".format(
                     REGISTERS_DICT[rd.value],REGISTERS_DICT[rt.value],
                     REGISTERS_DICT[rs.value]
                     )
-                print(instr_dict["name"]+" "+instr_dict["args"])
         elif func_code_u.value == REG_TYPE_JMPR:
             if(func_code_l.value < 1):
                 instr_dict["args"]="{}".format(REGISTERS_DICT[rs.value])
@@ -168,109 +174,742 @@ def mips_disass(num:ctypes.c_uint32)->str:
                 instr_dict["args"]="{}, {}".format(
                     REGISTERS_DICT[rd.value],REGISTERS_DICT[rs.value]
                     )
-                print(instr_dict["name"]+" "+instr_dict["args"])
         elif func_code_u.value == REG_TYPE_MOV:
-            if(func_code_l % 2 == 0):
+            if(func_code_l.value % 2 == 0):
                 instr_dict["args"]="{}".format(REGISTERS_DICT[rd.value])
-                print(instr_dict["name"]+" "+instr_dict["args"])
             else:
                 instr_dict["args"]="{}".format(REGISTERS_DICT[rs.value])
-                print(instr_dict["name"]+" "+instr_dict["args"])
         elif func_code_u.value == REG_TYPE_DIVMULT:
             instr_dict["args"]="{}, {}".format(
-                REGISTERS_DICT[rs.value],REGISTER_DICT[rt.value]
+                REGISTERS_DICT[rs.value],REGISTERS_DICT[rt.value]
                 )
-            print(instr_dict["name"]+" "+instr_dict["args"])
 
-        elif (func_code_u.value == REG_TYPE_ARITHLOG_GTE) or (func_code.value == REG_TYPE_ARITHLOG_GTE+1):
+        elif (func_code_u.value == REG_TYPE_ARITHLOG_GTE) or (func_code_u.value == REG_TYPE_ARITHLOG_GTE+1):
             instr_dict["args"]="{}, {}, {}".format(REGISTERS_DICT[rd.value],REGISTERS_DICT[rs.value],REGISTERS_DICT[rt.value])
-            print(instr_dict["name"]+" "+instr_dict["args"])
     elif(op_code.value == int(0x1c)):
         if func_code_u.value == REG_C_TYPE_MULT:
-            if(func_code_u.value == 2):
+            if(func_code_l.value == 2):
                 instr_dict["args"]="{}, {}, {}".format(
                     REGISTERS_DICT[rd.value],REGISTERS_DICT[rs.value],
                     REGISTERS_DICT[rt.value]
                     )
-                print(instr_dict["name"]+" "+instr_dict["args"])
             else:
                 instr_dict["args"]="{}, {}".format(
                     REGISTERS_DICT[rs.value],REGISTERS_DICT[rt.value]
                     )
-                print(instr_dict["name"]+" "+instr_dict["args"])
         elif func_code_u.value == REG_C_TYPE_COUNT:
             instr_dict["args"]="{}, {}".format(
                 REGISTERS_DICT[rd.value],REGISTERS_DICT[rs.value]
                 )
-            print(instr_dict["name"]+" "+instr_dict["args"])
     elif(op_code.value == 1):
         instr_dict["args"]="{}, {}".format(REGISTERS_DICT[rs.value],imm.value)
-        print(instr_dict["name"]+" "+instr_dict["args"])
 
     else:
         if op_code_u.value == R_TYPE_JMP_OR_BR:
             if(op_code_l.value < 4):
                 instr_dict["args"]="{}".format(tgt.value)
                 instr_dict["type"]=TYPE_J
-                print(instr_dict["name"]+" "+instr_dict["args"])
             else:
                 if(op_code_l.value < 6):
                     instr_dict["args"]="{}, {}, {}".format(
                             REGISTERS_DICT[rs.value],REGISTERS_DICT[rt.value],
                             hex(imm.value
                             ))
-                    print(instr_dict["name"]+" "+instr_dict["args"])
                 else:
                     instr_dict["args"]="{}, {}".format(
                             REGISTERS_DICT[rs.value],hex(imm.value)
                             )
-                    print(instr_dict["name"]+" "+instr_dict["args"])
         elif op_code_u.value == R_TYPE_ARITHLOGI:
             if(op_code_l.value < 7):
                 instr_dict["args"]="{}, {}, {}".format(
                         REGISTERS_DICT[rt.value],REGISTERS_DICT[rs.value],hex(imm.value)
                         )
-                print(instr_dict["name"]+" "+instr_dict["args"])
             else:
                 instr_dict["args"]="{}, {}".format(
                         REGISTERS_DICT[rt.value],hex(imm.value)
                         )
-                print(instr_dict["name"]+" "+instr_dict["args"])
         elif (op_code_u.value == R_TYPE_LSTR_GTE) or (op_code_u.value == R_TYPE_LSTR_GTE+1) or (op_code_u.value == R_TYPE_LSTR_GTE+2) or (op_code_u.value == R_TYPE_LSTR_GTE+3):
             instr_dict["args"]="{}, {}({})".format(
                     REGISTERS_DICT[rt.value],hex(imm.value),
                     REGISTERS_DICT[rs.value]
                     )
-            print(instr_dict["name"]+" "+instr_dict["args"])
-    return instr_dict["name"]+" "+instr_dict["args"]
+    if instr_dict["args"]:
+        result = instr_dict["name"]+" "+instr_dict["args"]
+    else:
+        result = instr_dict["name"]
+    if verbose:
+        print(result)
+    return result
+
+ASM_HEADER = ".text\n.globl main\nmain:\n"
+ASM_FOOTER = "li $v0, 10\nsyscall"
+STREAM_CHUNK_WORDS = 1 << 16
+PARALLEL_CHUNK_BYTES = 1 << 20
+DECODE_CACHE_SIZE = 1 << 16
+
+REGISTERS_NAMES = tuple(REGISTERS_DICT[i] for i in range(32))
+
+def _fmt_rd_rt_sa(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 11) & 31]}, {REGISTERS_NAMES[(w >> 16) & 31]}, {(w >> 6) & 31}"
+
+def _fmt_rd_rt_rs(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 11) & 31]}, {REGISTERS_NAMES[(w >> 16) & 31]}, {REGISTERS_NAMES[(w >> 21) & 31]}"
+
+def _fmt_rd_rs_rt(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 11) & 31]}, {REGISTERS_NAMES[(w >> 21) & 31]}, {REGISTERS_NAMES[(w >> 16) & 31]}"
+
+def _fmt_rd_rs(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 11) & 31]}, {REGISTERS_NAMES[(w >> 21) & 31]}"
+
+def _fmt_rs_rt(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 21) & 31]}, {REGISTERS_NAMES[(w >> 16) & 31]}"
+
+def _fmt_rd(w:int)->str:
+    return REGISTERS_NAMES[(w >> 11) & 31]
+
+def _fmt_rs(w:int)->str:
+    return REGISTERS_NAMES[(w >> 21) & 31]
+
+def _fmt_rs_imm_dec(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 21) & 31]}, {w & 0xffff}"
+
+def _fmt_rs_rt_imm(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 21) & 31]}, {REGISTERS_NAMES[(w >> 16) & 31]}, {hex(w & 0xffff)}"
+
+def _fmt_rs_imm(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 21) & 31]}, {hex(w & 0xffff)}"
+
+def _fmt_rt_rs_imm(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 16) & 31]}, {REGISTERS_NAMES[(w >> 21) & 31]}, {hex(w & 0xffff)}"
+
+def _fmt_rt_imm(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 16) & 31]}, {hex(w & 0xffff)}"
+
+def _fmt_rt_mem(w:int)->str:
+    return f"{REGISTERS_NAMES[(w >> 16) & 31]}, {hex(w & 0xffff)}({REGISTERS_NAMES[(w >> 21) & 31]})"
+
+def _fmt_target(w:int)->str:
+    tgt = w & 0x3ffffff
+    if tgt > 0x1ffffff:
+        tgt |= 0xfc000000
+    return str(tgt)
+
+def _special_fmt(u:int,l:int):
+    if u == REG_TYPE_SHIFT_OR_SHIFTV:
+        return _fmt_rd_rt_sa if l < 4 else _fmt_rd_rt_rs
+    if u == REG_TYPE_JMPR:
+        return _fmt_rs if l < 1 else _fmt_rd_rs
+    if u == REG_TYPE_MOV:
+        return _fmt_rd if l % 2 == 0 else _fmt_rs
+    if u == REG_TYPE_DIVMULT:
+        return _fmt_rs_rt
+    if u in (REG_TYPE_ARITHLOG_GTE,REG_TYPE_ARITHLOG_GTE+1):
+        return _fmt_rd_rs_rt
+    return None
+
+def _special2_fmt(u:int,l:int):
+    if u == REG_C_TYPE_MULT:
+        return _fmt_rd_rs_rt if l == 2 else _fmt_rs_rt
+    if u == REG_C_TYPE_COUNT:
+        return _fmt_rd_rs
+    return None
+
+def _root_fmt(u:int,l:int):
+    if u == R_TYPE_JMP_OR_BR:
+        if l < 4:
+            return _fmt_target
+        return _fmt_rs_rt_imm if l < 6 else _fmt_rs_imm
+    if u == R_TYPE_ARITHLOGI:
+        return _fmt_rt_rs_imm if l < 7 else _fmt_rt_imm
+    if R_TYPE_LSTR_GTE <= u <= R_TYPE_LSTR_GTE+3:
+        return _fmt_rt_mem
+    return None
+
+MNEMONICS = [".word","nop"]
+MNEMONIC_IDS = {".word":0,"nop":1}
+MNEMONIC_WORD, MNEMONIC_NOP = 0, 1
+
+def _mnemonic_id(name:str)->int:
+    if name not in MNEMONIC_IDS:
+        MNEMONIC_IDS[name] = len(MNEMONICS)
+        MNEMONICS.append(name)
+    return MNEMONIC_IDS[name]
+
+def _build_table(size:int,src:dict,fmt_cb,instr_type:str)->tuple:
+    """
+    Flattens one of the two-level name dicts into a table
+    indexed directly by the 6-bit (or 5-bit) field.
+    @size: number of slots of the table
+    @src: dict mapping the upper 3 bits to a list of names
+    @fmt_cb: returns the operand formatter for (upper, lower)
+    @instr_type: TYPE_R or TYPE_I, jumps are always TYPE_J
+    :return: tuple of (prefix, formatter, mnemonic id, type) or None per slot
+    """
+    table = [None]*size
+    for u, names in src.items():
+        for l, name in enumerate(names):
+            fmt = fmt_cb(u,l)
+            if name is None or fmt is None:
+                continue
+            table[(u << 3) | l] = (name+" ",fmt,_mnemonic_id(name),
+                    TYPE_J if fmt is _fmt_target else instr_type)
+    return tuple(table)
+
+SPECIAL_TABLE = _build_table(64,REGISTERS_INSTR_DICT,_special_fmt,TYPE_R)
+SPECIAL2_TABLE = _build_table(64,REGISTERS_C_DICT,_special2_fmt,TYPE_R)
+REGIMM_TABLE = _build_table(32,REGISTERS_RT_DICT,lambda u,l:_fmt_rs_imm_dec,TYPE_I)
+OPCODE_TABLE = _build_table(64,ROOT_DICT,_root_fmt,TYPE_I)
+
+OPERAND_LAYOUTS = {
+    _fmt_rd_rt_sa: ("rd","rt","sa"),
+    _fmt_rd_rt_rs: ("rd","rt","rs"),
+    _fmt_rd_rs_rt: ("rd","rs","rt"),
+    _fmt_rd_rs: ("rd","rs"),
+    _fmt_rs_rt: ("rs","rt"),
+    _fmt_rd: ("rd",),
+    _fmt_rs: ("rs",),
+    _fmt_rs_imm_dec: ("rs","imm"),
+    _fmt_rs_rt_imm: ("rs","rt","imm"),
+    _fmt_rs_imm: ("rs","imm"),
+    _fmt_rt_rs_imm: ("rt","rs","imm"),
+    _fmt_rt_imm: ("rt","imm"),
+    _fmt_rt_mem: ("rt","mem"),
+    _fmt_target: ("target",),
+    }
+
+def iter_encodings():
+    """
+    Yields (name, base word, operand layout) for every mnemonic of the
+    decode tables, the base word having all operand fields cleared.
+    """
+    for table, base, shift in ((OPCODE_TABLE,0,26),(SPECIAL_TABLE,0,0),
+            (SPECIAL2_TABLE,0x1c << 26,0),(REGIMM_TABLE,1 << 26,16)):
+        for idx, entry in enumerate(table):
+            if entry is not None:
+                yield entry[0].rstrip(), base | (idx << shift), OPERAND_LAYOUTS[entry[1]]
+
+def mips_decode(word:int)->str:
+    """
+    Table driven counterpart of mips_disass working on a plain int.
+    Encodings without a known mnemonic are emitted as .word directives.
+    """
+    if word == 0:
+        return "nop"
+    op_code = word >> 26
+    if op_code == 0:
+        entry = SPECIAL_TABLE[word & 63]
+    elif op_code == 0x1c:
+        entry = SPECIAL2_TABLE[word & 63]
+    elif op_code == 1:
+        entry = REGIMM_TABLE[(word >> 16) & 31]
+    else:
+        entry = OPCODE_TABLE[op_code]
+    if entry is None:
+        return ".word {}".format(hex(word))
+    return entry[0]+entry[1](word)
+
+def _lookup(word:int)->tuple:
+    op_code = word >> 26
+    if op_code == 0:
+        return SPECIAL_TABLE[word & 63], TYPE_R
+    if op_code == 0x1c:
+        return SPECIAL2_TABLE[word & 63], TYPE_R
+    if op_code == 1:
+        return REGIMM_TABLE[(word >> 16) & 31], TYPE_I
+    return OPCODE_TABLE[op_code], TYPE_I
+
+class Instruction(object):
+    """
+    Compact decoded instruction. Operand fields are sliced out of the
+    raw word on access and the text is only formatted when asked for.
+    """
+    __slots__ = ("addr","word","mnemonic_id","type")
+
+    def __init__(self:object,addr:int,word:int,mnemonic_id:int,instr_type:str)->None:
+        self.addr = addr
+        self.word = word
+        self.mnemonic_id = mnemonic_id
+        self.type = instr_type
+
+    @property
+    def name(self:object)->str:
+        return MNEMONICS[self.mnemonic_id]
+
+    @property
+    def opcode(self:object)->int:
+        return self.word >> 26
+
+    @property
+    def rs(self:object)->int:
+        return (self.word >> 21) & 31
+
+    @property
+    def rt(self:object)->int:
+        return (self.word >> 16) & 31
+
+    @property
+    def rd(self:object)->int:
+        return (self.word >> 11) & 31
+
+    @property
+    def sa(self:object)->int:
+        return (self.word >> 6) & 31
+
+    @property
+    def funct(self:object)->int:
+        return self.word & 63
+
+    @property
+    def imm(self:object)->int:
+        return self.word & 0xffff
+
+    @property
+    def target(self:object)->int:
+        return self.word & 0x3ffffff
+
+    @property
+    def text(self:object)->str:
+        return mips_decode(self.word)
+
+    def __str__(self:object)->str:
+        return mips_decode(self.word)
+
+    def __repr__(self:object)->str:
+        return "Instruction({}, {})".format(hex(self.addr),repr(mips_decode(self.word)))
+
+def decode_instruction(word:int,addr:int=0)->Instruction:
+    if word == 0:
+        return Instruction(addr,word,MNEMONIC_NOP,TYPE_R)
+    entry, instr_type = _lookup(word)
+    if entry is None:
+        return Instruction(addr,word,MNEMONIC_WORD,instr_type)
+    return Instruction(addr,word,entry[2],entry[3])
+
+class DecodeCache(object):
+    """
+    Bounded LRU cache in front of a decoder, keyed by the raw word.
+    Instances are callable and can be passed wherever a decode_cb
+    is expected.
+    """
+    def __init__(self:object,size:int=DECODE_CACHE_SIZE,decode_cb=mips_decode)->None:
+        if size < 1:
+            raise ValueError("cache size must be at least 1")
+        self.size = size
+        self.decode_cb = decode_cb
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self:object,word:int)->str:
+        entries = self.entries
+        text = entries.get(word)
+        if text is not None:
+            entries.move_to_end(word)
+            self.hits += 1
+            return text
+        self.misses += 1
+        text = self.decode_cb(word)
+        entries[word] = text
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return text
+
+    def clear(self:object)->None:
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self:object)->dict:
+        lookups = self.hits+self.misses
+        return {"size":self.size,"entries":len(self.entries),"hits":self.hits,
+                "misses":self.misses,"evictions":self.evictions,
+                "hit_rate":self.hits/lookups if lookups else 0.0}
 
-def read_input_and_save(file_name:object,out_file:object)->None:
+class NullSink(object):
+    """Discards all output."""
+    def write(self:object,text:str)->None:
+        pass
+
+    def close(self:object)->None:
+        pass
+
+class FileSink(object):
+    """Writes output to a file through a large buffer."""
+    def __init__(self:object,file_name:str,buffering:int=1 << 20)->None:
+        self.file = open(file_name,"w",buffering=buffering)
+
+    def write(self:object,text:str)->None:
+        self.file.write(text)
+
+    def close(self:object)->None:
+        self.file.close()
+
+class StdoutSink(object):
+    """Writes output to sys.stdout."""
+    def write(self:object,text:str)->None:
+        sys.stdout.write(text)
+
+    def close(self:object)->None:
+        sys.stdout.flush()
+
+class CallbackSink(object):
+    """Hands every chunk of output to a callable."""
+    def __init__(self:object,callback)->None:
+        self.callback = callback
+
+    def write(self:object,text:str)->None:
+        self.callback(text)
+
+    def close(self:object)->None:
+        pass
+
+class WriterSink(object):
+    """
+    Writes to a file-like object owned by the caller, which is only
+    flushed on close and stays open.
+    """
+    def __init__(self:object,writer:object)->None:
+        self.writer = writer
+
+    def write(self:object,text:str)->None:
+        self.writer.write(text)
+
+    def close(self:object)->None:
+        if hasattr(self.writer,"flush"):
+            self.writer.flush()
+
+class TeeSink(object):
+    """Duplicates output into several sinks."""
+    def __init__(self:object,*sinks)->None:
+        self.sinks = sinks
+
+    def write(self:object,text:str)->None:
+        for sink in self.sinks:
+            sink.write(text)
+
+    def close(self:object)->None:
+        for sink in self.sinks:
+            sink.close()
+
+def open_sink(target:object,verbose:bool=False)->object:
+    """
+    Turns an output target into a sink.
+    @target: None (discard), "-" or sys.stdout (stdout), a file name,
+    one of the sinks above (closed when done), any other object with a
+    write method (flushed but left open) or a callable receiving text
+    chunks
+    @verbose: additionally echo everything to stdout
+    """
+    if target is None:
+        sink = NullSink()
+    elif isinstance(target,str):
+        sink = StdoutSink() if target == "-" else FileSink(target)
+    elif target is sys.stdout:
+        sink = StdoutSink()
+    elif isinstance(target,(NullSink,FileSink,StdoutSink,CallbackSink,WriterSink,TeeSink)):
+        sink = target
+    elif hasattr(target,"write"):
+        sink = WriterSink(target)
+    elif callable(target):
+        sink = CallbackSink(target)
+    else:
+        raise TypeError("unsupported output target {}".format(repr(target)))
+    if verbose and not isinstance(sink,StdoutSink):
+        sink = TeeSink(sink,StdoutSink())
+    return sink
+
+def read_input_and_save(file_name:object,out_file:object,decode_cb=mips_decode,
+        verbose:bool=False)->None:
     with open(file_name,"rb") as fd:
         file_content = fd.read()
 
     reg_ip = 0
     entry_addr = 0
 
-    file = open(out_file,"w")
-    file.write(".text\n")
-    file.write(".globl main\n")
-    file.write("main:\n")
-    while(reg_ip-entry_addr < len(file_content)):
-        num = struct.unpack("<I",file_content[reg_ip-entry_addr:reg_ip+4-entry_addr])[0]
-        c_num = ctypes.c_uint32(num)
-        result = mips_disass(c_num)+"\n"
-        file.write(result)
-        reg_ip += 4
-    file.write("li $v0, 10\n")
-    file.write("syscall")
-    file.close()
+    sink = open_sink(out_file,verbose)
+    try:
+        sink.write(ASM_HEADER)
+        while(reg_ip-entry_addr+4 <= len(file_content)):
+            num = struct.unpack("<I",file_content[reg_ip-entry_addr:reg_ip+4-entry_addr])[0]
+            sink.write(decode_cb(num)+"\n")
+            reg_ip += 4
+        sink.write(ASM_FOOTER)
+    finally:
+        sink.close()
+
+def iter_word_chunks(file_name:str,offset:int=0,length:int=None,
+        chunk_words:int=STREAM_CHUNK_WORDS):
+    """
+    Memory-maps only the requested window of @file_name and yields
+    (address, words) pairs, @chunk_words words at a time.
+    @offset: byte offset of the first word, must be word aligned
+    @length: number of bytes to read, up to the end of file if None
+    """
+    if offset % 4:
+        raise ValueError("offset {} is not word aligned".format(offset))
+    with open(file_name,"rb") as fd:
+        size = os.fstat(fd.fileno()).st_size
+        end = size if length is None else min(size,offset+length)
+        end = offset + max(0,end-offset)//4*4
+        if end <= offset:
+            return
+        map_off = offset - offset % mmap.ALLOCATIONGRANULARITY
+        with mmap.mmap(fd.fileno(),end-map_off,access=mmap.ACCESS_READ,
+                offset=map_off) as mm:
+            view = memoryview(mm)
+            try:
+                for start in range(offset-map_off,end-map_off,chunk_words*4):
+                    stop = min(end-map_off,start+chunk_words*4)
+                    words = [w for (w,) in struct.iter_unpack("<I",view[start:stop])]
+                    yield map_off+start, words
+                    if hasattr(mmap,"MADV_DONTNEED"):
+                        page = start - start % mmap.PAGESIZE
+                        mm.madvise(mmap.MADV_DONTNEED,page,stop-page)
+            finally:
+                view.release()
+
+def iter_instructions(file_name:str,offset:int=0,length:int=None,decode_cb=mips_decode):
+    """
+    Generator of (address, word, text) for every word in the window.
+    """
+    for addr, words in iter_word_chunks(file_name,offset,length):
+        for word in words:
+            yield addr, word, decode_cb(word)
+            addr += 4
+
+def iter_instruction_records(file_name:str,offset:int=0,length:int=None):
+    """
+    Generator of Instruction records for every word in the window.
+    """
+    for addr, words in iter_word_chunks(file_name,offset,length):
+        for word in words:
+            yield decode_instruction(word,addr)
+            addr += 4
+
+def read_input_and_save_stream(file_name:str,out_file:object,offset:int=0,
+        length:int=None,decode_cb=mips_decode,verbose:bool=False)->None:
+    """
+    Streaming variant of read_input_and_save with flat memory usage:
+    every chunk of words is decoded and written with a single write.
+    """
+    sink = open_sink(out_file,verbose)
+    try:
+        sink.write(ASM_HEADER)
+        for addr, words in iter_word_chunks(file_name,offset,length):
+            sink.write("\n".join(map(decode_cb,words))+"\n")
+        sink.write(ASM_FOOTER)
+    finally:
+        sink.close()
+
+_worker_decode = mips_decode
+
+def _init_worker(cache_size:int)->None:
+    global _worker_decode
+    if cache_size:
+        _worker_decode = DecodeCache(cache_size)
+
+def _cache_counters()->tuple:
+    if isinstance(_worker_decode,DecodeCache):
+        return _worker_decode.hits, _worker_decode.misses, _worker_decode.evictions
+    return 0, 0, 0
+
+def _disass_slice(file_name:str,offset:int,length:int)->tuple:
+    """
+    Worker of read_input_and_save_parallel: decodes one aligned slice.
+    :return: text, (hits, misses, evictions) of the worker cache on this slice
+    """
+    before = _cache_counters()
+    lines = list()
+    for addr, words in iter_word_chunks(file_name,offset,length):
+        lines.extend(map(_worker_decode,words))
+    counters = tuple(b-a for a, b in zip(before,_cache_counters()))
+    if not lines:
+        return "", counters
+    return "\n".join(lines)+"\n", counters
+
+def read_input_and_save_parallel(file_name:str,out_file:object,jobs:int,offset:int=0,
+        length:int=None,chunk_bytes:int=PARALLEL_CHUNK_BYTES,cache_size:int=0,
+        verbose:bool=False)->dict:
+    """
+    Splits the window into word aligned slices, decodes them in a
+    process pool and writes the results in address order, so the
+    output is identical to read_input_and_save_stream.
+    @jobs: number of worker processes
+    @chunk_bytes: size of one slice, rounded down to a multiple of 4
+    @cache_size: size of the per worker DecodeCache, disabled if 0
+    :return: worker cache statistics summed over all workers, like
+    DecodeCache.stats() without entries, None without cache
+    """
+    end = os.path.getsize(file_name)
+    if length is not None:
+        end = min(end,offset+length)
+    chunk_bytes = max(4,chunk_bytes//4*4)
+    slices = ((start,min(chunk_bytes,end-start)) for start in range(offset,end,chunk_bytes))
+    sink = open_sink(out_file,verbose)
+    totals = [0, 0, 0]
+
+    def collect(future)->None:
+        text, counters = future.result()
+        for i, count in enumerate(counters):
+            totals[i] += count
+        sink.write(text)
+
+    try:
+        with ProcessPoolExecutor(max_workers=jobs,initializer=_init_worker,
+                initargs=(cache_size,)) as pool:
+            sink.write(ASM_HEADER)
+            pending = deque()
+            for start, size in slices:
+                pending.append(pool.submit(_disass_slice,file_name,start,size))
+                if len(pending) >= 2*jobs:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+            sink.write(ASM_FOOTER)
+    finally:
+        sink.close()
+    if not cache_size:
+        return None
+    hits, misses, evictions = totals
+    lookups = hits+misses
+    return {"size":cache_size,"hits":hits,"misses":misses,"evictions":evictions,
+            "hit_rate":hits/lookups if lookups else 0.0}
+
+def _require_numpy()->None:
+    if np is None:
+        print("[!] Please run python3 -m pip install numpy")
+        sys.exit(-1)
+
+if np is not None:
+    INSTRUCTION_DTYPE = np.dtype([("addr","<u4"),("word","<u4"),("mnemonic_id","<u2"),
+        ("type","u1"),("opcode","u1"),("rs","u1"),("rt","u1"),("rd","u1"),("sa","u1"),
+        ("funct","u1"),("imm","<u2"),("target","<u4")])
+
+def load_words(file_name:str)->object:
+    """
+    Maps a .bin file as a little endian uint32 array without copying.
+    Trailing bytes that do not form a full word are ignored.
+    """
+    _require_numpy()
+    count = os.path.getsize(file_name) // 4
+    if count == 0:
+        return np.empty(0,dtype="<u4")
+    return np.memmap(file_name,dtype="<u4",mode="r",shape=(count,))
+
+def decode_columns(words:object,base_addr:int=0)->dict:
+    """
+    Splits all words into their instruction fields at once.
+    @words: uint32 array as returned by load_words
+    @base_addr: address of the first word
+    :return: dict of column arrays, one entry per word
+    """
+    _require_numpy()
+    words = np.asarray(words,dtype=np.uint32)
+    return {
+        "addr": base_addr+4*np.arange(len(words),dtype=np.uint32),
+        "word": words,
+        "opcode": (words >> 26).astype(np.uint8),
+        "rs": ((words >> 21) & 31).astype(np.uint8),
+        "rt": ((words >> 16) & 31).astype(np.uint8),
+        "rd": ((words >> 11) & 31).astype(np.uint8),
+        "sa": ((words >> 6) & 31).astype(np.uint8),
+        "funct": (words & 63).astype(np.uint8),
+        "imm": (words & 0xffff).astype(np.uint16),
+        "target": words & 0x3ffffff,
+        }
+
+def disass_columns(columns:dict,mask:object=None,decode_cb=mips_decode)->list:
+    """
+    Formats only the rows selected by @mask (all rows if None).
+    """
+    words = columns["word"]
+    if mask is not None:
+        words = words[mask]
+    return list(map(decode_cb,words.tolist()))
+
+TYPE_CODES = (TYPE_R,TYPE_I,TYPE_J)
+
+def _batch_tables()->tuple:
+    """
+    numpy views of the decode tables: mnemonic id and type code per slot.
+    """
+    tables = list()
+    for table, default in ((OPCODE_TABLE,TYPE_I),(SPECIAL_TABLE,TYPE_R),
+            (SPECIAL2_TABLE,TYPE_R),(REGIMM_TABLE,TYPE_I)):
+        mnem = np.array([e[2] if e else MNEMONIC_WORD for e in table],dtype=np.uint16)
+        types = np.array([TYPE_CODES.index(e[3] if e else default) for e in table],
+                dtype=np.uint8)
+        tables.append((mnem,types))
+    return tuple(tables)
+
+_BATCH_TABLES = None
+
+def decode_batch(words:object,base_addr:int=0)->object:
+    """
+    Decodes all words into a structured array of INSTRUCTION_DTYPE
+    without formatting any text. The "type" column holds an index
+    into TYPE_CODES and "mnemonic_id" one into MNEMONICS.
+    """
+    global _BATCH_TABLES
+    columns = decode_columns(words,base_addr)
+    if _BATCH_TABLES is None:
+        _BATCH_TABLES = _batch_tables()
+    root, special, special2, regimm = _BATCH_TABLES
+    batch = np.empty(len(columns["word"]),dtype=INSTRUCTION_DTYPE)
+    for name in ("addr","word","opcode","rs","rt","rd","sa","funct","imm","target"):
+        batch[name] = columns[name]
+    op_code, funct = columns["opcode"], columns["funct"]
+    for col, idx in (("mnemonic_id",0),("type",1)):
+        out = root[idx][op_code]
+        out = np.where(op_code == 0,special[idx][funct],out)
+        out = np.where(op_code == 0x1c,special2[idx][funct],out)
+        out = np.where(op_code == 1,regimm[idx][columns["rt"]],out)
+        batch[col] = out
+    batch["mnemonic_id"][columns["word"] == 0] = MNEMONIC_NOP
+    return batch
+
+def read_input_and_save_bulk(file_name:str,out_file:object,mask_cb=None,
+        decode_cb=mips_decode,verbose:bool=False)->None:
+    """
+    Bulk variant of read_input_and_save.
+    @mask_cb: optional callable taking the column dict and returning
+    a boolean mask of the rows to emit
+    """
+    columns = decode_columns(load_words(file_name))
+    mask = mask_cb(columns) if mask_cb is not None else None
+    lines = disass_columns(columns,mask,decode_cb)
+    sink = open_sink(out_file,verbose)
+    try:
+        sink.write(ASM_HEADER)
+        if lines:
+            sink.write("\n".join(lines)+"\n")
+        sink.write(ASM_FOOTER)
+    finally:
+        sink.close()
+
+def show_cache_stats(stats:dict,workers:int=1)->None:
+    """
+    Prints decode cache statistics to stderr, stdout may carry the
+    disassembly (--save -).
+    """
+    print("[*] Decode cache{}: {} hits, {} misses, {} evictions, hit rate {:.1%}".format(
+        "" if workers == 1 else " ({} workers)".format(workers),
+        stats["hits"],stats["misses"],stats["evictions"],stats["hit_rate"]),file=sys.stderr)
 
 def main():
     des="MIPS32-Disassembler with Python3."
     epi="Built by Qu@ntumCyb3rW01f/Qu@ntumH@ck3r Thi Altenschmidt."
     parser=argparse.ArgumentParser(description=des,epilog=epi)
     parser.add_argument("--file","-f",action="store",dest="bin_file",type=str,help="Specify a MIPS32 bin file to disassembly.",required=True)
-    parser.add_argument("--save","-s",action="store",dest="out_file",type=str,help="Specify file name to save the output result.",default="mips32_disass_output.s")
+    parser.add_argument("--save","-s",action="store",dest="out_file",type=str,help="Specify file name to save the output result, - for stdout.",default="mips32_disass_output.s")
+    parser.add_argument("--verbose","-v",action="store_true",dest="verbose",help="Echo the disassembly to stdout as well.")
+    parser.add_argument("--bulk","-b",action="store_true",dest="bulk",help="Decode the whole file at once with numpy (optional dependency).")
+    parser.add_argument("--stream","-t",action="store_true",dest="stream",help="Memory-map the input and write the output in chunks.")
+    parser.add_argument("--offset","-o",action="store",dest="offset",type=lambda x:int(x,0),help="Byte offset of the first word to disassemble (implies --stream).",default=0)
+    parser.add_argument("--length","-l",action="store",dest="length",type=lambda x:int(x,0),help="Number of bytes to disassemble (implies --stream).",default=None)
+    parser.add_argument("--cache","-c",action="store",dest="cache",type=int,help="Size of the decoded instruction LRU cache, 0 disables it.",default=0)
+    parser.add_argument("--jobs","-j",action="store",dest="jobs",type=int,help="Number of worker processes for parallel disassembly.",default=1)
     given_args=parser.parse_args()
     bin_file,out_file=given_args.bin_file,given_args.out_file
 
@@ -281,7 +920,31 @@ def main():
     if file_extension != ".bin":
         print("[-] File {} ist not a binary file.".format(bin_file))
         sys.exit(-1)
-    read_input_and_save(bin_file,out_file)
+    if given_args.offset % 4:
+        print("[-] Offset {} is not a multiple of 4.".format(hex(given_args.offset)))
+        sys.exit(-1)
+    if given_args.jobs < 1:
+        print("[-] Number of jobs must be at least 1.")
+        sys.exit(-1)
+    if given_args.cache < 0:
+        print("[-] Cache size must not be negative.")
+        sys.exit(-1)
+    if given_args.jobs > 1:
+        stats = read_input_and_save_parallel(bin_file,out_file,given_args.jobs,given_args.offset,
+                given_args.length,cache_size=given_args.cache,verbose=given_args.verbose)
+        if stats is not None:
+            show_cache_stats(stats,given_args.jobs)
+        return
+    decode_cb = DecodeCache(given_args.cache) if given_args.cache else mips_decode
+    if given_args.stream or given_args.offset or given_args.length is not None:
+        read_input_and_save_stream(bin_file,out_file,given_args.offset,given_args.length,
+                decode_cb,given_args.verbose)
+    elif given_args.bulk:
+        read_input_and_save_bulk(bin_file,out_file,decode_cb=decode_cb,verbose=given_args.verbose)
+    else:
+        read_input_and_save(bin_file,out_file,decode_cb,given_args.verbose)
+    if given_args.cache:
+        show_cache_stats(decode_cb.stats())
 
 if __name__ == "__main__":
     main()
@@ -1,29 +1,60 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import pexpect, re, sys, os, argparse, sys, time
+import re, sys, os, argparse, queue, threading, asyncio
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import pexpect
+except ImportError:
+    pexpect = None
+
+from array import array
+from mips32_interpreter import Machine, assemble, AssemblerError, MachineError, REGISTER_NUMBERS, \
+        DUMP_NAMES, DUMP_HI, DUMP_LO, DUMP_PC, Profile, save_profile, hot_spots, mnemonic_counts
+
+SPIM_PROMPT = "(spim) "
+
+class EmulatorError(Exception):
+    pass
+
+def parse_reg_dump(text:str)->array:
+    """
+    Parses the output of spim's print_all_regs hex into an array laid
+    out as DUMP_NAMES.
+    """
+    dump = array("I",[0]*len(DUMP_NAMES))
+    for num, val in re.findall(r'R(\d+)\s*\[\w+\]\s*=\s*([0-9a-fA-F]+)',text):
+        dump[int(num)] = int(val,16)
+    for name, idx in (("HI",DUMP_HI),("LO",DUMP_LO),("PC",DUMP_PC)):
+        match = re.search(r'\b{}\s*=\s*([0-9a-fA-F]+)'.format(name),text)
+        if match:
+            dump[idx] = int(match.group(1),16)
+    return dump
 
 class Emulating(object):
     def __init__(self:object,db=False)->None:
+        if pexpect is None:
+            raise EmulatorError("Please run python3 -m pip install pexpect")
         self.db=db
-        self.spawn=pexpect.spawn('spim',encoding="utf-8")
-        self._pexpect('\(spim\)')
+        self.timed_out=False
+        try:
+            self.spawn=pexpect.spawn('spim',encoding="utf-8")
+        except pexpect.ExceptionPexpect as err:
+            raise EmulatorError("Could not start spim: {}".format(err))
+        self._pexpect(r'\(spim\)')
         if not '(spim)' in self.spawn.after:
-            print("[!] Spim is not installed: {}".format(self.spawn.after))
-            sys.exit(-1)
+            raise EmulatorError("Spim is not installed: {}".format(self.spawn.after))
 
     def _send_cmd(self:object,line:str)->None:
         if not self.spawn.isalive():
-            print("[-] Child process is not alive")
-            sys.exit(-1)
+            raise EmulatorError("Child process is not alive")
         if self.db:
             print("[*] === Sending === [*] {}".format(line))
         self.spawn.sendline(line)
 
     def _pexpect(self:object,pattern:str,timeout=-1,size=None)->int:
         if not self.spawn.isalive():
-            print("[-] Child process is not alive")
-            sys.exit(-1)
+            raise EmulatorError("Child process is not alive")
         if self.db:
             print("[*] === Expecting === [*] {}".format(pattern))
         ind = self.spawn.expect(pattern,timeout=timeout,searchwindowsize=size)
@@ -34,97 +65,633 @@ class Emulating(object):
 
     def load_file(self:object,file_name:str)->None:
         self._send_cmd("load \"{}\"".format(file_name))
-        ind = self._pexpect(['Cannot open file.*\(spim\) ','\(spim\)',pexpect.EOF,
+        ind = self._pexpect([r'Cannot open file.*\(spim\) ',r'\(spim\)',pexpect.EOF,
             pexpect.TIMEOUT],timeout=10)
         if ind == 0:
-            print("[-] Could not load assembly file {}".format(file_name))
-            sys.exit(-1)
+            raise EmulatorError("Could not load assembly file {}".format(file_name))
         elif ind == 1: pass #not implemented
         elif ind == 2:
-            print("[-] End of File")
-            sys.exit(-1)
+            raise EmulatorError("End of File")
         elif ind == 3:
-            print("[-] Time out")
-            sys.exit(-1)
+            raise EmulatorError("Time out")
         else:
-            print("[-] Something went wrong")
-            sys.exit(-1)
+            raise EmulatorError("Something went wrong")
 
     def run_spim(self:object,timeout=10,timeoutfatal=False)->str:
+        """
+        Runs the loaded program and returns its output. On timeout
+        timed_out is set and the output received so far is returned.
+        """
+        self.timed_out=False
         self._send_cmd('run')
-        ind = self._pexpect(['.*\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
-        if ind == 0: pass
+        ind = self._pexpect([r'.*\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
+        if ind == 0:
+            output = (self.spawn.before+self.spawn.after)[:-len(SPIM_PROMPT)].replace("\r\n","\n")
+            # drop the echo of the command by the terminal
+            if output.startswith("run"):
+                output = output.partition("\n")[2]
+            return output
         elif ind == 1:
-            print("[-] End of File")
-            sys.exit(-1)
+            raise EmulatorError("End of File")
         elif ind == 2:
+            self.timed_out=True
+            if timeoutfatal:
+                raise EmulatorError("Time out")
             ind = self._pexpect(['.*',pexpect.EOF,pexpect.TIMEOUT],timeout = .1)
             if ind == 0 or ind == 1:
                 return self.spawn.before + self.spawn.after
             else:
                 return ""
         else:
-            print('[-] Something went wrong')
-            sys.exit(-1)
+            raise EmulatorError("Something went wrong")
 
     def reg_eval(self:object,register:str,timeout=10)->hex:
        self._send_cmd('print {}'.format(register))
-       ind = self._pexpect(['.*Reg.*0x([0-9a-f])+.*\(spim\) ',
-           '.*Unkown label:.*\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
+       ind = self._pexpect([r'.*Reg.*0x([0-9a-f])+.*\(spim\) ',
+           r'.*Unkown label:.*\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
        if ind == 0:
-           match = re.search('.*Reg.* = (0x[0-9a-f]+) .*\(spim\) ',self.spawn.after,
+           match = re.search(r'.*Reg.* = (0x[0-9a-f]+) .*\(spim\) ',self.spawn.after,
                    re.DOTALL)
            val = hex(int(match.group(1),0))
            return val
        elif ind == 1:
-           print("[-] Unknown label: {}".format(repr(register)))
-           sys.exit(-1)
+           raise EmulatorError("Unknown label: {}".format(repr(register)))
        elif ind == 2:
-           print("[-] End of File")
-           sys.exit(-1)
+           raise EmulatorError("End of File")
        elif ind == 3:
-           print("[-] Time out")
-           sys.exit(-1)
+           raise EmulatorError("Time out")
        else:
-           print('[-] Something went wrong')
-           sys.exit(-1)
+           raise EmulatorError("Something went wrong")
+
+    def reg_dump(self:object,timeout=10)->array:
+        """
+        Reads all registers with a single print_all_regs round-trip.
+        :return: array laid out as DUMP_NAMES
+        """
+        self._send_cmd('print_all_regs hex')
+        ind = self._pexpect([r'.*\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
+        if ind != 0:
+            raise EmulatorError("Could not read the register file")
+        return parse_reg_dump(self.spawn.after)
+
+    def mem_dump(self:object,ranges:list,timeout=10)->list:
+        """
+        Reads every (addr, size) range word by word. All print commands
+        are sent at once and the prompts collected afterwards, so the
+        whole dump costs one round-trip.
+        """
+        words = sorted({w for addr, size in ranges for w in range(addr & ~3,addr+size,4)})
+        self._send_cmd("\n".join("print {}".format(hex(w)) for w in words))
+        text = ""
+        for _ in words:
+            ind = self._pexpect([r'\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
+            if ind != 0:
+                raise EmulatorError("Could not read memory")
+            text += self.spawn.before
+        values = {}
+        for addr, val in re.findall(r'@ 0x([0-9a-fA-F]+) \(-?\d+\) = 0x([0-9a-fA-F]+)',text):
+            values[int(addr,16)] = int(val,16)
+        image = b"".join(values.get(w,0).to_bytes(4,"little") for w in words)
+        base = {w:i*4 for i, w in enumerate(words)}
+        return [image[base[addr & ~3]+(addr & 3):base[addr & ~3]+(addr & 3)+size]
+                for addr, size in ranges]
+
+    def reinitialize(self:object,timeout=10)->None:
+        """
+        Clears memory and registers so the process can load the next program.
+        """
+        self._send_cmd('reinitialize')
+        ind = self._pexpect([r'\(spim\) ',pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
+        if ind != 0:
+            raise EmulatorError("Could not reinitialize spim")
+
+    def close(self:object)->None:
+        if self.spawn.isalive():
+            self.spawn.terminate(force=True)
 
     def quit_prog(self:object,timeout=10)->None:
         self._send_cmd('quit')
         ind = self._pexpect([pexpect.EOF,pexpect.TIMEOUT],timeout=timeout)
         if ind == 0: pass
         elif ind == 1:
-            print("[-] Time out")
-            sys.exit(-1)
+            raise EmulatorError("Time out")
         else:
-            print('[-] Something went wrong')
-            sys.exit(-1)
+            raise EmulatorError("Something went wrong")
+
+class NativeEmulating(object):
+    """
+    In-process replacement for Emulating with the same interface,
+    executing the program with mips32_interpreter instead of spim.
+    """
+    def __init__(self:object,db=False,input_cb=None,translate=True,profile=False)->None:
+        self.db=db
+        self.machine=Machine(input_cb,translate)
+        if profile:
+            self.machine.profile=Profile()
+        self.symbols={}
+        self.error=None
+        self.timed_out=False
+
+    def load_file(self:object,file_name:str)->None:
+        try:
+            with open(file_name,"r") as fd:
+                source = fd.read()
+        except OSError:
+            raise EmulatorError("Could not load assembly file {}".format(file_name))
+        try:
+            prog = assemble(source)
+        except AssemblerError as err:
+            raise EmulatorError("Could not assemble file {}: {}".format(file_name,err))
+        if self.db:
+            print("[*] === Loaded === [*] {} words, {} bytes of data".format(
+                len(prog.text),len(prog.data)))
+        self.machine.load(prog)
+        self.symbols=prog.symbols
+
+    def run_spim(self:object,timeout=10,timeoutfatal=False)->str:
+        self.error=None
+        self.timed_out=False
+        try:
+            halted = self.machine.run(timeout=timeout)
+        except MachineError as err:
+            self.error=err
+            print("[-] Exception: {}".format(err))
+            return self.machine.read_output()
+        if self.db:
+            print("[*] === Executed === [*] {} instructions".format(self.machine.steps))
+        self.timed_out = not halted
+        if not halted and timeoutfatal:
+            raise EmulatorError("Time out")
+        return self.machine.read_output()
+
+    def reg_eval(self:object,register:str,timeout=10)->hex:
+        name = register.strip().lower()
+        if not name.startswith("$"):
+            name = "$"+name
+        if name in REGISTER_NUMBERS:
+            return hex(self.machine.regs[REGISTER_NUMBERS[name]])
+        if name in ("$hi","$lo","$pc"):
+            return hex(getattr(self.machine,name[1:]))
+        raise EmulatorError("Unknown label: {}".format(repr(register)))
+
+    def reg_dump(self:object,timeout=10)->array:
+        return self.machine.register_dump()
+
+    def mem_dump(self:object,ranges:list,timeout=10)->list:
+        return self.machine.memory_dump(ranges)
+
+    def stats(self:object)->dict:
+        return self.machine.stats()
+
+    def profile_arrays(self:object)->dict:
+        """
+        Profile of the runs so far as arrays, see Profile.to_arrays().
+        """
+        if self.machine.profile is None:
+            raise EmulatorError("Profiling is not enabled")
+        return self.machine.profile.to_arrays(self.machine.mem)
+
+    def run_to(self:object,label:str,max_steps=None)->bool:
+        """
+        Runs the loaded program up to @label, e.g. the point where a
+        later checkpoint() should be taken.
+        """
+        if label not in self.symbols:
+            raise EmulatorError("Unknown label: {}".format(repr(label)))
+        return self.machine.run_until(self.symbols[label],max_steps)
+
+    def checkpoint(self:object)->object:
+        return self.machine.checkpoint()
+
+    def restore(self:object,snap:object)->None:
+        self.machine.restore(snap)
+
+    def reinitialize(self:object,timeout=10)->None:
+        self.machine.reset()
+
+    def close(self:object)->None:
+        pass
+
+    def quit_prog(self:object,timeout=10)->None:
+        self.machine.reset()
+
+class EmulatorPool(object):
+    """
+    Keeps @workers long-lived emulators and runs assembly files on
+    them from a thread pool. Emulators are reinitialized between jobs
+    and replaced after a job failed or timed out.
+    """
+    def __init__(self:object,workers=None,backend="spim",db=False)->None:
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.db = db
+        self.idle = queue.Queue()
+        self.started = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _new_emulator(self:object)->object:
+        if self.backend == "spim":
+            return Emulating(db=self.db)
+        return NativeEmulating(db=self.db,input_cb=lambda:"")
+
+    def _acquire(self:object)->object:
+        """
+        An idle emulator, or None if the caller has to start a new one.
+        The slot is reserved under the lock, the emulator is built by
+        the job outside of it so a slow or failing start does not hold
+        up the other jobs. A failed job hands its slot back as None.
+        """
+        with self.lock:
+            if self.idle.empty() and self.started < self.workers:
+                self.started += 1
+                return None
+        return self.idle.get()
+
+    def _job(self:object,file_name:str,timeout:float)->dict:
+        result = {"file":file_name,"output":"","registers":None,"error":None}
+        emul = self._acquire()
+        healthy = False
+        try:
+            if emul is None:
+                emul = self._new_emulator()
+            emul.reinitialize()
+            emul.load_file(file_name)
+            result["output"] = emul.run_spim(timeout=timeout)
+            if isinstance(emul,NativeEmulating) and emul.error is not None:
+                raise emul.error
+            if emul.timed_out:
+                raise TimeoutError("timed out after {}s".format(timeout))
+            result["registers"] = emul.reg_dump()
+            healthy = True
+        except Exception as err:
+            result["error"] = str(err) or type(err).__name__
+        finally:
+            if not healthy and emul is not None:
+                emul.close()
+            self.idle.put(emul if healthy else None)
+        return result
+
+    def submit(self:object,file_name:str,timeout:float=10)->object:
+        """
+        Queues @file_name and returns a Future of its result dict with
+        the keys file, output, registers (array laid out as DUMP_NAMES)
+        and error (None on success).
+        """
+        return self.executor.submit(self._job,file_name,timeout)
+
+    def map(self:object,file_names:list,timeout:float=10):
+        futures = [self.submit(file_name,timeout) for file_name in file_names]
+        for future in futures:
+            yield future.result()
+
+    def close(self:object)->None:
+        self.executor.shutdown(wait=True)
+        while not self.idle.empty():
+            emul = self.idle.get()
+            if emul is not None:
+                emul.close()
+
+    def __enter__(self:object)->object:
+        return self
+
+    def __exit__(self:object,*exc)->None:
+        self.close()
+
+class _AsyncDriver(object):
+    """
+    Shared part of the asyncio drivers: run_spim() on top of run_iter().
+    """
+    async def run_spim(self:object,timeout=10,output_cb=None)->str:
+        """
+        Runs the loaded program and returns its output. Every chunk is
+        passed to @output_cb (plain or coroutine function) as soon as it
+        arrives. On timeout timed_out is set and the output received so
+        far is returned.
+        """
+        self.timed_out = False
+        out = list()
+        try:
+            async for chunk in self.run_iter(timeout):
+                out.append(chunk)
+                if output_cb is not None:
+                    res = output_cb(chunk)
+                    if asyncio.iscoroutine(res):
+                        await res
+        except asyncio.TimeoutError:
+            self.timed_out = True
+        return "".join(out)
+
+class AsyncEmulating(_AsyncDriver):
+    """
+    asyncio counterpart of Emulating driving spim through
+    non-blocking pipes instead of pexpect. Create it with
+    "await AsyncEmulating.create()".
+    """
+    def __init__(self:object,db=False)->None:
+        self.db=db
+        self.proc=None
+        self.buffer=""
+        self.timed_out=False
+
+    @classmethod
+    async def create(cls:type,db=False)->object:
+        self = cls(db)
+        await self._spawn()
+        return self
+
+    async def _spawn(self:object)->None:
+        try:
+            self.proc = await asyncio.create_subprocess_exec("spim",
+                    stdin=asyncio.subprocess.PIPE,stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT)
+        except FileNotFoundError:
+            raise EmulatorError("Spim is not installed")
+        self.buffer = ""
+        await self._read_until_prompt(10)
+
+    async def restart(self:object)->None:
+        """
+        Replaces the spim process by a fresh one, the program has to be
+        loaded again.
+        """
+        await self.close()
+        await self._spawn()
+
+    async def _send_cmd(self:object,line:str)->None:
+        if self.proc.returncode is not None:
+            raise EmulatorError("Child process is not alive")
+        if self.db:
+            print("[*] === Sending === [*] {}".format(line))
+        self.proc.stdin.write((line+"\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+
+    async def _iter_until_prompt(self:object,timeout):
+        """
+        Yields the child's output chunk by chunk up to the next prompt,
+        holding back only what could be the start of the prompt.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()+timeout if timeout is not None else None
+        while True:
+            idx = self.buffer.find(SPIM_PROMPT)
+            if idx >= 0:
+                chunk, self.buffer = self.buffer[:idx], self.buffer[idx+len(SPIM_PROMPT):]
+                if chunk:
+                    yield chunk
+                return
+            safe = len(self.buffer)-len(SPIM_PROMPT)+1
+            if safe > 0:
+                chunk, self.buffer = self.buffer[:safe], self.buffer[safe:]
+                yield chunk
+            remaining = deadline-loop.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            data = await asyncio.wait_for(self.proc.stdout.read(4096),remaining)
+            if not data:
+                raise EOFError("spim exited")
+            if self.db:
+                print("[*] === Received === [*] {}".format(repr(data)))
+            self.buffer += data.decode("utf-8","replace")
+
+    async def _read_until_prompt(self:object,timeout)->str:
+        return "".join([chunk async for chunk in self._iter_until_prompt(timeout)])
+
+    async def _command(self:object,line:str,timeout)->str:
+        await self._send_cmd(line)
+        try:
+            return await self._read_until_prompt(timeout)
+        except asyncio.TimeoutError:
+            raise EmulatorError("Time out")
+        except EOFError:
+            raise EmulatorError("End of File")
+
+    async def load_file(self:object,file_name:str)->None:
+        text = await self._command("load \"{}\"".format(file_name),10)
+        if "Cannot open file" in text:
+            raise EmulatorError("Could not load assembly file {}".format(file_name))
+
+    async def run_iter(self:object,timeout=10):
+        """
+        Async iterator over the program output while it runs.
+        Cancelling the consumer kills the spim process. On timeout spim
+        is still running the program, so it is restarted before the
+        TimeoutError is raised; otherwise the next command would read
+        the rest of this run.
+        """
+        await self._send_cmd("run")
+        try:
+            async for chunk in self._iter_until_prompt(timeout):
+                yield chunk
+        except asyncio.CancelledError:
+            await self.close()
+            raise
+        except asyncio.TimeoutError:
+            await self.restart()
+            raise
+
+    async def reg_eval(self:object,register:str,timeout=10)->hex:
+        text = await self._command("print {}".format(register),timeout)
+        match = re.search('Reg.* = (0x[0-9a-f]+)',text)
+        if match is None:
+            raise EmulatorError("Unknown label: {}".format(repr(register)))
+        return hex(int(match.group(1),0))
+
+    async def reg_dump(self:object,timeout=10)->array:
+        return parse_reg_dump(await self._command("print_all_regs hex",timeout))
+
+    async def reinitialize(self:object,timeout=10)->None:
+        await self._command("reinitialize",timeout)
+
+    async def close(self:object)->None:
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+
+    async def quit_prog(self:object,timeout=10)->None:
+        await self._send_cmd("quit")
+        try:
+            await asyncio.wait_for(self.proc.wait(),timeout)
+        except asyncio.TimeoutError:
+            print("[-] Time out")
+            await self.close()
+
+class AsyncNativeEmulating(_AsyncDriver):
+    """
+    asyncio wrapper of NativeEmulating. The program runs in slices of
+    @slice_steps instructions and yields to the event loop in between,
+    so many of them can share one loop.
+    """
+    def __init__(self:object,db=False,input_cb=None,slice_steps=1 << 14)->None:
+        self.emul=NativeEmulating(db,input_cb if input_cb is not None else (lambda:""))
+        self.slice_steps=slice_steps
+        self.timed_out=False
+
+    @classmethod
+    async def create(cls:type,db=False,input_cb=None)->object:
+        return cls(db,input_cb)
+
+    async def load_file(self:object,file_name:str)->None:
+        self.emul.load_file(file_name)
+
+    async def run_iter(self:object,timeout=10):
+        machine = self.emul.machine
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()+timeout if timeout is not None else None
+        self.emul.error = None
+        while not machine.halted:
+            try:
+                machine.run(max_steps=self.slice_steps)
+            except MachineError as err:
+                self.emul.error = err
+                print("[-] Exception: {}".format(err))
+            # not yielded from a finally block, an early aclose() would
+            # otherwise be ignored
+            out = machine.read_output()
+            if out:
+                yield out
+            if self.emul.error is not None:
+                break
+            if deadline is not None and loop.time() > deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(0)
+
+    async def reg_eval(self:object,register:str,timeout=10)->hex:
+        return self.emul.reg_eval(register)
+
+    async def reg_dump(self:object,timeout=10)->array:
+        return self.emul.reg_dump()
+
+    async def reinitialize(self:object,timeout=10)->None:
+        self.emul.reinitialize()
+
+    async def close(self:object)->None:
+        pass
+
+    async def quit_prog(self:object,timeout=10)->None:
+        self.emul.quit_prog()
+
+async def emulate_many(file_names:list,backend="native",limit=100,timeout=10,output_cb=None)->list:
+    """
+    Runs all @file_names on one event loop, at most @limit at a time.
+    @output_cb: called with (file name, chunk) for streamed output
+    :return: result dicts as produced by EmulatorPool, in input order
+    """
+    sem = asyncio.Semaphore(limit)
+    cls = AsyncEmulating if backend == "spim" else AsyncNativeEmulating
+
+    async def one(file_name:str)->dict:
+        result = {"file":file_name,"output":"","registers":None,"error":None}
+        async with sem:
+            emul = None
+            try:
+                emul = await cls.create()
+                await emul.load_file(file_name)
+                cb = (lambda chunk:output_cb(file_name,chunk)) if output_cb is not None else None
+                out = list()
+                try:
+                    async for chunk in emul.run_iter(timeout):
+                        out.append(chunk)
+                        if cb is not None:
+                            cb(chunk)
+                finally:
+                    result["output"] = "".join(out)
+                if isinstance(emul,AsyncNativeEmulating) and emul.emul.error is not None:
+                    raise emul.emul.error
+                result["registers"] = await emul.reg_dump()
+            except asyncio.TimeoutError:
+                result["error"] = "timed out after {}s".format(timeout)
+            except Exception as err:
+                result["error"] = str(err) or type(err).__name__
+            finally:
+                if emul is not None:
+                    await emul.close()
+        return result
+
+    return await asyncio.gather(*(one(file_name) for file_name in file_names))
 
 def main()->None:
     des="MIPS32 Emulator with Python3."
     epi="Built by Qu@ntumCyb3rW01f/Qu@ntumH@ck3r Thi Altenschmidt"
     parser=argparse.ArgumentParser(description=des,epilog=epi)
-    parser.add_argument("--file","-f",action="store",type=str,dest="ass_file",
-            help="Specify an assembly file to load.",required=True)
+    parser.add_argument("--file","-f",action="store",type=str,dest="ass_files",nargs="+",
+            help="Specify one or more assembly files to load.",required=True)
+    parser.add_argument("--backend","-b",action="store",type=str,dest="backend",
+            choices=["native","spim"],default="native",
+            help="Run the program in-process or through spim.")
+    parser.add_argument("--stats","-s",action="store_true",dest="stats",
+            help="Print execution statistics of the native backend.")
+    parser.add_argument("--workers","-w",action="store",type=int,dest="workers",default=None,
+            help="Number of emulators used when several files are given.")
+    parser.add_argument("--async","-a",action="store_true",dest="use_async",
+            help="Run several files on one asyncio event loop instead of a thread pool.")
+    parser.add_argument("--timeout","-t",action="store",type=float,dest="timeout",default=10,
+            help="Timeout in seconds for running one program.")
+    parser.add_argument("--profile","-p",action="store",type=str,dest="profile",default=None,
+            help="Profile the native backend and save the counters to this file.")
+    parser.add_argument("--hot","-H",action="store",type=int,dest="hot",default=0,
+            help="Print the N most executed instructions of the native backend.")
     given_args = parser.parse_args()
-    ass_file = given_args.ass_file
+    register_list = ["$s0","$s1","$s2","$s3","$s4"]
 
-    if not os.path.exists(ass_file):
-        print("[-] File {} doesn't exist".format(repr(ass_file)))
-        sys.exit(-1)
+    for ass_file in given_args.ass_files:
+        if not os.path.exists(ass_file):
+            print("[-] File {} doesn't exist".format(repr(ass_file)))
+            sys.exit(-1)
+
+    if len(given_args.ass_files) > 1:
+        if given_args.use_async:
+            results = asyncio.run(emulate_many(given_args.ass_files,given_args.backend,
+                given_args.workers or 100,given_args.timeout))
+        else:
+            pool = EmulatorPool(given_args.workers,given_args.backend)
+            results = pool.map(given_args.ass_files,given_args.timeout)
+        for result in results:
+            if result["error"] is not None:
+                print("[-] {}: {}".format(result["file"],result["error"]))
+                continue
+            values = ", ".join("{}={}".format(register,hex(result["registers"][DUMP_NAMES.index(register)]))
+                    for register in register_list)
+            print("[+] {}: {}".format(result["file"],values))
+        if not given_args.use_async:
+            pool.close()
+        return
+    ass_file = given_args.ass_files[0]
 
-    emul = Emulating(db=False)
+    if given_args.backend == "spim":
+        emul = Emulating(db=False)
+    else:
+        emul = NativeEmulating(db=False,profile=bool(given_args.profile or given_args.hot))
     emul.load_file(ass_file)
-    emul.run_spim()
+    output = emul.run_spim(timeout=given_args.timeout)
+    if output:
+        print(output)
+    if given_args.backend == "native" and given_args.stats:
+        stats = emul.stats()
+        print("[*] {} instructions in {:.3f}s ({:,.0f} instr/s), {} blocks translated, {} block cache hits, {} invalidations".format(
+            stats["instructions"],stats["seconds"],stats["ips"],stats["blocks_translated"],
+            stats["block_hits"],stats["invalidations"]))
+    if given_args.backend == "native" and (given_args.profile or given_args.hot):
+        arrays = emul.profile_arrays()
+        if given_args.profile:
+            save_profile(given_args.profile,arrays)
+        if given_args.hot:
+            print("[*] Hot spots:")
+            for line in hot_spots(arrays,given_args.hot):
+                print(line)
+            print("[*] Mnemonics: {}".format(", ".join("{}={}".format(name,count)
+                for name, count in list(mnemonic_counts(arrays).items())[:given_args.hot])))
 
-    register_list = ["$s0","$s1","$s2","$s3","$s4"]
+    dump = emul.reg_dump()
     for register in register_list:
-        print("Register {}  has value: {}".format(register,emul.reg_eval(register)))
+        print("Register {}  has value: {}".format(register,hex(dump[DUMP_NAMES.index(register)])))
 
-    time.sleep(0.5)
     print("[*] Quitting program...")
-    time.sleep(0.5)
     emul.quit_prog()
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except EmulatorError as err:
+        print("[-] {}".format(err))
+        sys.exit(-1)
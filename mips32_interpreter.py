@@ -0,0 +1,1354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re, struct, sys, time
+from array import array
+from collections import defaultdict
+
+from mips32_disassembler import REGISTERS_DICT, iter_encodings, mips_decode, decode_instruction
+
+TEXT_BASE = 0x00400000
+USER_TEXT_BASE = 0x00400024
+DATA_BASE = 0x10010000
+GP_INIT = 0x10008000
+STACK_TOP = 0x7fffeffc
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE-1
+MASK32 = 0xffffffff
+
+SYSCALL_PRINT_INT = 1
+SYSCALL_PRINT_STRING = 4
+SYSCALL_READ_INT = 5
+SYSCALL_READ_STRING = 8
+SYSCALL_SBRK = 9
+SYSCALL_EXIT = 10
+SYSCALL_PRINT_CHAR = 11
+SYSCALL_READ_CHAR = 12
+SYSCALL_EXIT2 = 17
+
+REGISTER_NUMBERS = {name:num for num, name in REGISTERS_DICT.items()}
+REGISTER_NUMBERS.update({"${}".format(num):num for num in range(32)})
+REGISTER_NUMBERS["$s8"] = 30
+# layout of Machine.register_dump(): $0..$31, then HI, LO and PC
+DUMP_HI, DUMP_LO, DUMP_PC = 32, 33, 34
+DUMP_NAMES = tuple(REGISTERS_DICT[i] for i in range(32))+("$hi","$lo","$pc")
+
+class AssemblerError(Exception):
+    pass
+
+class MachineError(Exception):
+    pass
+
+def _signed(x:int)->int:
+    return x - ((x & 0x80000000) << 1)
+
+def _simm(w:int)->int:
+    return ((w & 0xffff) ^ 0x8000) - 0x8000
+
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+class Memory(object):
+    """
+    Sparse little endian memory made of lazily allocated pages.
+    Reads from pages never written return zeros.
+    Pages are copy-on-write after checkpoint(): @owned holds the pages
+    written since the last checkpoint or restore, every other page may
+    be shared with a snapshot.
+    """
+    def __init__(self:object)->None:
+        self.pages = {}
+        self.owned = {}
+        self.base = None
+
+    def _page(self:object,addr:int)->bytearray:
+        page = self.owned.get(addr >> PAGE_BITS)
+        if page is None:
+            page = self._own(addr >> PAGE_BITS)
+        return page
+
+    def _own(self:object,num:int)->bytearray:
+        page = self.pages.get(num)
+        if page is None:
+            page = bytearray(PAGE_SIZE)
+        elif self.base is not None:
+            page = bytearray(page)
+        self.pages[num] = self.owned[num] = page
+        return page
+
+    def checkpoint(self:object)->dict:
+        """
+        Freezes the current pages and returns them as a snapshot.
+        Costs one dict copy, the pages themselves are shared.
+        """
+        self.base = dict(self.pages)
+        self.owned = {}
+        return self.base
+
+    def restore(self:object,snap:dict)->list:
+        """
+        Brings memory back to @snap. Restoring the last snapshot again
+        only touches the pages written since.
+        :return: numbers of the pages that changed
+        """
+        if snap is self.base:
+            dirty = list(self.owned)
+            for num in dirty:
+                page = snap.get(num)
+                if page is None:
+                    del self.pages[num]
+                else:
+                    self.pages[num] = page
+        else:
+            dirty = [num for num in self.pages.keys() | snap.keys()
+                    if self.pages.get(num) is not snap.get(num)]
+            self.pages.clear()
+            self.pages.update(snap)
+            self.base = snap
+        self.owned = {}
+        return dirty
+
+    def read_u8(self:object,addr:int)->int:
+        page = self.pages.get(addr >> PAGE_BITS)
+        return page[addr & PAGE_MASK] if page is not None else 0
+
+    def read_u16(self:object,addr:int)->int:
+        if addr & 1:
+            raise MachineError("Unaligned halfword read at {}".format(hex(addr)))
+        page = self.pages.get(addr >> PAGE_BITS)
+        return _U16.unpack_from(page,addr & PAGE_MASK)[0] if page is not None else 0
+
+    def read_u32(self:object,addr:int)->int:
+        if addr & 3:
+            raise MachineError("Unaligned word read at {}".format(hex(addr)))
+        page = self.pages.get(addr >> PAGE_BITS)
+        return _U32.unpack_from(page,addr & PAGE_MASK)[0] if page is not None else 0
+
+    def write_u8(self:object,addr:int,val:int)->None:
+        self._page(addr)[addr & PAGE_MASK] = val & 0xff
+
+    def write_u16(self:object,addr:int,val:int)->None:
+        if addr & 1:
+            raise MachineError("Unaligned halfword write at {}".format(hex(addr)))
+        _U16.pack_into(self._page(addr),addr & PAGE_MASK,val & 0xffff)
+
+    def write_u32(self:object,addr:int,val:int)->None:
+        if addr & 3:
+            raise MachineError("Unaligned word write at {}".format(hex(addr)))
+        _U32.pack_into(self._page(addr),addr & PAGE_MASK,val & MASK32)
+
+    def write_bytes(self:object,addr:int,data:bytes)->None:
+        for i, byte in enumerate(data):
+            self.write_u8(addr+i,byte)
+
+    def read_bytes(self:object,addr:int,size:int)->bytes:
+        out = bytearray()
+        while size > 0:
+            off = addr & PAGE_MASK
+            n = min(size,PAGE_SIZE-off)
+            page = self.pages.get(addr >> PAGE_BITS)
+            out += page[off:off+n] if page is not None else bytes(n)
+            addr, size = (addr+n) & MASK32, size-n
+        return bytes(out)
+
+    def read_cstring(self:object,addr:int,limit:int=1 << 20)->bytes:
+        out = bytearray()
+        while len(out) < limit:
+            byte = self.read_u8(addr+len(out))
+            if byte == 0:
+                break
+            out.append(byte)
+        return bytes(out)
+
+#
+# Assembler
+#
+
+ENCODINGS = {name:(base,layout) for name, base, layout in iter_encodings()}
+ENCODINGS["syscall"] = (0x0000000c,())
+ENCODINGS["break"] = (0x0000000d,())
+ENCODINGS["nop"] = (0x00000000,())
+BRANCHES = {"beq","bne","blez","bgtz","bltz","bgez","bltzal","bgezal"}
+DATA_SIZES = {".word":4,".half":2,".byte":1}
+R_TO_I = {"add":"addi","addu":"addiu","and":"andi","or":"ori","xor":"xori",
+        "slt":"slti","sltu":"sltiu"}
+
+_LABEL_RE = re.compile(r"^\s*([A-Za-z_.][\w.]*)\s*:")
+_MEM_RE = re.compile(r"^(.*)\(\s*(\$\w+)\s*\)$")
+_OFFSET_RE = re.compile(r"^([A-Za-z_.][\w.]*)\s*([+-]\s*\w+)$")
+
+class Program(object):
+    """
+    Result of assemble(): encoded text words, data bytes and symbols.
+    """
+    def __init__(self:object)->None:
+        self.text = list()
+        self.data = bytearray()
+        self.symbols = {}
+        self.entry = USER_TEXT_BASE
+
+def _strip_comment(line:str)->str:
+    quoted = None
+    for i, c in enumerate(line):
+        if quoted:
+            if c == "\\":
+                continue
+            if c == quoted and line[i-1] != "\\":
+                quoted = None
+        elif c in "\"'":
+            quoted = c
+        elif c == "#":
+            return line[:i]
+    return line
+
+def _split_operands(text:str)->list:
+    text = text.strip()
+    if not text:
+        return []
+    return [op.strip() for op in text.split(",")]
+
+def _parse_string(text:str)->bytes:
+    text = text.strip()
+    if len(text) < 2 or text[0] != '"' or text[-1] != '"':
+        raise AssemblerError("expected string literal, got {}".format(text))
+    return text[1:-1].encode("latin-1").decode("unicode_escape").encode("latin-1")
+
+def _is_literal(text:str)->bool:
+    text = text.strip()
+    if len(text) >= 3 and text[0] == "'" and text[-1] == "'":
+        return True
+    try:
+        int(text,0)
+    except ValueError:
+        return False
+    return True
+
+class _Assembler(object):
+
+    def __init__(self:object)->None:
+        self.symbols = {}
+        self.resolve = False
+
+    def number(self:object,text:str)->int:
+        text = text.strip()
+        if len(text) >= 3 and text[0] == "'" and text[-1] == "'":
+            return ord(text[1:-1].encode("latin-1").decode("unicode_escape"))
+        try:
+            return int(text,0)
+        except ValueError:
+            pass
+        if text in self.symbols:
+            return self.symbols[text]
+        match = _OFFSET_RE.match(text)
+        if match:
+            return self.number(match.group(1))+int(match.group(2).replace(" ",""),0)
+        if not self.resolve:
+            return 0
+        raise AssemblerError("unknown label {}".format(repr(text)))
+
+    def register(self:object,text:str)->int:
+        try:
+            return REGISTER_NUMBERS[text.strip()]
+        except KeyError:
+            raise AssemblerError("unknown register {}".format(repr(text)))
+
+    def expand(self:object,name:str,ops:list)->list:
+        """
+        Rewrites pseudo instructions into real ones. The number of
+        instructions returned must not depend on label values.
+        """
+        if name == "li":
+            val = self.number(ops[1]) & MASK32
+            if not _is_literal(ops[1]):
+                return [("lui",[ops[0],str(val >> 16)]),("ori",[ops[0],ops[0],str(val & 0xffff)])]
+            if val <= 0xffff:
+                return [("ori",[ops[0],"$zero",str(val)])]
+            if val >= 0xffff8000:
+                return [("addiu",[ops[0],"$zero",str(val & 0xffff)])]
+            return [("lui",[ops[0],str(val >> 16)]),("ori",[ops[0],ops[0],str(val & 0xffff)])]
+        if name == "la":
+            if _MEM_RE.match(ops[1]):
+                return [("addiu",[ops[0]]+list(reversed(_MEM_RE.match(ops[1]).groups())))]
+            val = self.number(ops[1]) & MASK32
+            return [("lui",[ops[0],str(val >> 16)]),("ori",[ops[0],ops[0],str(val & 0xffff)])]
+        if name == "move":
+            return [("addu",[ops[0],ops[1],"$zero"])]
+        if name == "not":
+            return [("nor",[ops[0],ops[1],"$zero"])]
+        if name in ("neg","negu"):
+            return [("sub" if name == "neg" else "subu",[ops[0],"$zero",ops[1]])]
+        if name == "b":
+            return [("beq",["$zero","$zero",ops[0]])]
+        if name in ("beqz","bnez"):
+            return [(name[:3],[ops[0],"$zero",ops[1]])]
+        if name in ("blt","bge","bgt","ble","bltu","bgeu","bgtu","bleu"):
+            slt = "sltu" if name.endswith("u") else "slt"
+            cmp_ops = [ops[0],ops[1]] if name[:3] in ("blt","bge") else [ops[1],ops[0]]
+            br = "bne" if name[:3] in ("blt","bgt") else "beq"
+            return [(slt,["$at"]+cmp_ops),(br,["$at","$zero",ops[2]])]
+        if name in ("div","divu") and len(ops) == 3:
+            return [(name,ops[1:]),("mflo",[ops[0]])]
+        if name in ("rem","remu"):
+            return [("div" if name == "rem" else "divu",ops[1:]),("mfhi",[ops[0]])]
+        if name == "jalr" and len(ops) == 1:
+            return [("jalr",["$ra",ops[0]])]
+        if name in R_TO_I and len(ops) == 3 and not ops[2].startswith("$"):
+            return [(R_TO_I[name],ops)]
+        if name in ("sub","subu") and len(ops) == 3 and not ops[2].startswith("$"):
+            return [("addi" if name == "sub" else "addiu",[ops[0],ops[1],str(-self.number(ops[2]))])]
+        if name in ENCODINGS and ENCODINGS[name][1][-1:] == ("mem",) and not _MEM_RE.match(ops[-1]):
+            val = self.number(ops[-1]) & MASK32
+            hi = ((val+0x8000) >> 16) & 0xffff
+            return [("lui",["$at",str(hi)]),(name,ops[:-1]+["{}($at)".format(val & 0xffff)])]
+        return [(name,ops)]
+
+    def encode(self:object,name:str,ops:list,pc:int)->int:
+        if name not in ENCODINGS:
+            raise AssemblerError("unknown instruction {}".format(repr(name)))
+        word, layout = ENCODINGS[name]
+        if len(ops) != len(layout):
+            raise AssemblerError("{} expects {} operands".format(name,len(layout)))
+        for kind, op in zip(layout,ops):
+            if kind == "rs":
+                word |= self.register(op) << 21
+            elif kind == "rt":
+                word |= self.register(op) << 16
+            elif kind == "rd":
+                word |= self.register(op) << 11
+            elif kind == "sa":
+                word |= (self.number(op) & 31) << 6
+            elif kind == "imm":
+                if name in BRANCHES and op in self.symbols:
+                    word |= ((self.symbols[op]-pc-4) >> 2) & 0xffff
+                else:
+                    word |= self.number(op) & 0xffff
+            elif kind == "mem":
+                off, reg = _MEM_RE.match(op).groups()
+                word |= (self.number(off) if off.strip() else 0) & 0xffff
+                word |= self.register(reg) << 21
+            elif kind == "target":
+                if op in self.symbols:
+                    word |= (self.symbols[op] >> 2) & 0x3ffffff
+                else:
+                    word |= self.number(op) & 0x3ffffff
+        return word
+
+    def directive(self:object,name:str,args:str,data:bytearray)->None:
+        if name in DATA_SIZES:
+            size = DATA_SIZES[name]
+            for op in _split_operands(args):
+                data.extend((self.number(op) & ((1 << 8*size)-1)).to_bytes(size,"little"))
+        elif name in (".ascii",".asciiz"):
+            data.extend(_parse_string(args))
+            if name == ".asciiz":
+                data.append(0)
+        elif name == ".space":
+            data.extend(bytes(self.number(args)))
+        elif name == ".align":
+            data.extend(bytes(-len(data) % (1 << self.number(args))))
+        else:
+            raise AssemblerError("unsupported directive {}".format(name))
+
+    def bind(self:object,label:str,addr:int)->None:
+        if self.resolve:
+            return
+        if label in self.symbols:
+            raise AssemblerError("label {} defined twice".format(label))
+        self.symbols[label] = addr
+
+    def run(self:object,source:str)->Program:
+        """
+        Two passes over the source: the first one collects label
+        addresses, the second one encodes with all labels known.
+        Data labels are bound after the alignment of the directive
+        following them, as spim does.
+        """
+        lines = source.splitlines()
+        for self.resolve in (False,True):
+            prog = Program()
+            segment = "text"
+            pc = USER_TEXT_BASE
+            pending = list()
+            for lineno, line in enumerate(lines,1):
+                try:
+                    line = _strip_comment(line)
+                    match = _LABEL_RE.match(line)
+                    while match:
+                        if segment == "text":
+                            self.bind(match.group(1),pc)
+                        else:
+                            pending.append(match.group(1))
+                        line = line[match.end():]
+                        match = _LABEL_RE.match(line)
+                    line = line.strip()
+                    if not line:
+                        continue
+                    parts = line.split(None,1)
+                    name = parts[0].lower()
+                    args = parts[1] if len(parts) > 1 else ""
+                    if segment == "data" and name in DATA_SIZES:
+                        prog.data.extend(bytes(-len(prog.data) % DATA_SIZES[name]))
+                    while pending:
+                        self.bind(pending.pop(0),DATA_BASE+len(prog.data))
+                    if name in (".text",".ktext"):
+                        segment = "text"
+                    elif name in (".data",".kdata",".rdata",".sdata"):
+                        segment = "data"
+                    elif name in (".globl",".global",".extern",".ent",".end",".set"):
+                        pass
+                    elif name.startswith("."):
+                        if segment == "text" and name == ".word":
+                            for op in _split_operands(args):
+                                prog.text.append(self.number(op) & MASK32)
+                                pc += 4
+                        elif segment == "text":
+                            raise AssemblerError("{} in text segment".format(name))
+                        else:
+                            self.directive(name,args,prog.data)
+                    else:
+                        for real, ops in self.expand(name,_split_operands(args)):
+                            prog.text.append(self.encode(real,ops,pc) if self.resolve else 0)
+                            pc += 4
+                except AssemblerError as err:
+                    raise AssemblerError("line {}: {}".format(lineno,err))
+                except (IndexError,ValueError,AttributeError) as err:
+                    raise AssemblerError("line {}: cannot parse {}".format(lineno,repr(line)))
+            while pending:
+                self.bind(pending.pop(0),DATA_BASE+len(prog.data))
+        prog.symbols = dict(self.symbols)
+        prog.entry = self.symbols.get("main",USER_TEXT_BASE)
+        return prog
+
+def assemble(source:str)->Program:
+    return _Assembler().run(source)
+
+#
+# Interpreter
+#
+
+def _branch(pc:int,w:int)->int:
+    return (pc+4+(_simm(w) << 2)) & MASK32
+
+def _i_sll(m,w,pc):
+    m.regs[(w >> 11) & 31] = (m.regs[(w >> 16) & 31] << ((w >> 6) & 31)) & MASK32
+    return pc+4
+
+def _i_srl(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.regs[(w >> 16) & 31] >> ((w >> 6) & 31)
+    return pc+4
+
+def _i_sra(m,w,pc):
+    m.regs[(w >> 11) & 31] = (_signed(m.regs[(w >> 16) & 31]) >> ((w >> 6) & 31)) & MASK32
+    return pc+4
+
+def _i_sllv(m,w,pc):
+    m.regs[(w >> 11) & 31] = (m.regs[(w >> 16) & 31] << (m.regs[(w >> 21) & 31] & 31)) & MASK32
+    return pc+4
+
+def _i_srlv(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.regs[(w >> 16) & 31] >> (m.regs[(w >> 21) & 31] & 31)
+    return pc+4
+
+def _i_srav(m,w,pc):
+    m.regs[(w >> 11) & 31] = (_signed(m.regs[(w >> 16) & 31]) >> (m.regs[(w >> 21) & 31] & 31)) & MASK32
+    return pc+4
+
+def _i_jr(m,w,pc):
+    return m.regs[(w >> 21) & 31]
+
+def _i_jalr(m,w,pc):
+    target = m.regs[(w >> 21) & 31]
+    m.regs[(w >> 11) & 31] = pc+4
+    return target
+
+def _i_syscall(m,w,pc):
+    m.syscall()
+    return pc+4
+
+def _i_break(m,w,pc):
+    raise MachineError("Breakpoint at {}".format(hex(pc)))
+
+def _i_mfhi(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.hi
+    return pc+4
+
+def _i_mthi(m,w,pc):
+    m.hi = m.regs[(w >> 21) & 31]
+    return pc+4
+
+def _i_mflo(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.lo
+    return pc+4
+
+def _i_mtlo(m,w,pc):
+    m.lo = m.regs[(w >> 21) & 31]
+    return pc+4
+
+def _set_acc(m,val:int)->None:
+    m.lo = val & MASK32
+    m.hi = (val >> 32) & MASK32
+
+def _i_mult(m,w,pc):
+    _set_acc(m,_signed(m.regs[(w >> 21) & 31])*_signed(m.regs[(w >> 16) & 31]))
+    return pc+4
+
+def _i_multu(m,w,pc):
+    _set_acc(m,m.regs[(w >> 21) & 31]*m.regs[(w >> 16) & 31])
+    return pc+4
+
+def _i_div(m,w,pc):
+    a, b = _signed(m.regs[(w >> 21) & 31]), _signed(m.regs[(w >> 16) & 31])
+    if b != 0:
+        q = abs(a)//abs(b)
+        if (a < 0) != (b < 0):
+            q = -q
+        m.lo, m.hi = q & MASK32, (a-q*b) & MASK32
+    return pc+4
+
+def _i_divu(m,w,pc):
+    a, b = m.regs[(w >> 21) & 31], m.regs[(w >> 16) & 31]
+    if b != 0:
+        m.lo, m.hi = a//b, a % b
+    return pc+4
+
+def _i_add(m,w,pc):
+    val = _signed(m.regs[(w >> 21) & 31])+_signed(m.regs[(w >> 16) & 31])
+    if not -0x80000000 <= val <= 0x7fffffff:
+        raise MachineError("Arithmetic overflow at {}".format(hex(pc)))
+    m.regs[(w >> 11) & 31] = val & MASK32
+    return pc+4
+
+def _i_addu(m,w,pc):
+    m.regs[(w >> 11) & 31] = (m.regs[(w >> 21) & 31]+m.regs[(w >> 16) & 31]) & MASK32
+    return pc+4
+
+def _i_sub(m,w,pc):
+    val = _signed(m.regs[(w >> 21) & 31])-_signed(m.regs[(w >> 16) & 31])
+    if not -0x80000000 <= val <= 0x7fffffff:
+        raise MachineError("Arithmetic overflow at {}".format(hex(pc)))
+    m.regs[(w >> 11) & 31] = val & MASK32
+    return pc+4
+
+def _i_subu(m,w,pc):
+    m.regs[(w >> 11) & 31] = (m.regs[(w >> 21) & 31]-m.regs[(w >> 16) & 31]) & MASK32
+    return pc+4
+
+def _i_and(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.regs[(w >> 21) & 31] & m.regs[(w >> 16) & 31]
+    return pc+4
+
+def _i_or(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.regs[(w >> 21) & 31] | m.regs[(w >> 16) & 31]
+    return pc+4
+
+def _i_xor(m,w,pc):
+    m.regs[(w >> 11) & 31] = m.regs[(w >> 21) & 31] ^ m.regs[(w >> 16) & 31]
+    return pc+4
+
+def _i_nor(m,w,pc):
+    m.regs[(w >> 11) & 31] = ~(m.regs[(w >> 21) & 31] | m.regs[(w >> 16) & 31]) & MASK32
+    return pc+4
+
+def _i_slt(m,w,pc):
+    m.regs[(w >> 11) & 31] = int(_signed(m.regs[(w >> 21) & 31]) < _signed(m.regs[(w >> 16) & 31]))
+    return pc+4
+
+def _i_sltu(m,w,pc):
+    m.regs[(w >> 11) & 31] = int(m.regs[(w >> 21) & 31] < m.regs[(w >> 16) & 31])
+    return pc+4
+
+def _i_madd(m,w,pc):
+    acc = _signed(m.hi)*(1 << 32)+m.lo
+    _set_acc(m,acc+_signed(m.regs[(w >> 21) & 31])*_signed(m.regs[(w >> 16) & 31]))
+    return pc+4
+
+def _i_maddu(m,w,pc):
+    _set_acc(m,(m.hi << 32 | m.lo)+m.regs[(w >> 21) & 31]*m.regs[(w >> 16) & 31])
+    return pc+4
+
+def _i_msub(m,w,pc):
+    acc = _signed(m.hi)*(1 << 32)+m.lo
+    _set_acc(m,acc-_signed(m.regs[(w >> 21) & 31])*_signed(m.regs[(w >> 16) & 31]))
+    return pc+4
+
+def _i_msubu(m,w,pc):
+    _set_acc(m,(m.hi << 32 | m.lo)-m.regs[(w >> 21) & 31]*m.regs[(w >> 16) & 31])
+    return pc+4
+
+def _i_mul(m,w,pc):
+    m.regs[(w >> 11) & 31] = (_signed(m.regs[(w >> 21) & 31])*_signed(m.regs[(w >> 16) & 31])) & MASK32
+    return pc+4
+
+def _i_clz(m,w,pc):
+    m.regs[(w >> 11) & 31] = 32-m.regs[(w >> 21) & 31].bit_length()
+    return pc+4
+
+def _i_clo(m,w,pc):
+    m.regs[(w >> 11) & 31] = 32-(~m.regs[(w >> 21) & 31] & MASK32).bit_length()
+    return pc+4
+
+def _i_regimm(m,w,pc):
+    rt = (w >> 16) & 31
+    val = _signed(m.regs[(w >> 21) & 31])
+    if rt in (0,1,0x10,0x11):
+        taken = val < 0 if rt & 1 == 0 else val >= 0
+        if rt & 0x10:
+            m.regs[31] = pc+4
+        return _branch(pc,w) if taken else pc+4
+    imm = _simm(w)
+    if rt in (9,0xb):
+        val, imm = val & MASK32, imm & MASK32
+    trap = {8:val >= imm,9:val >= imm,0xa:val < imm,0xb:val < imm,
+            0xc:val == imm,0xe:val != imm}.get(rt)
+    if trap is None:
+        raise MachineError("Reserved instruction at {}".format(hex(pc)))
+    if trap:
+        raise MachineError("Trap at {}".format(hex(pc)))
+    return pc+4
+
+def _i_j(m,w,pc):
+    return ((pc+4) & 0xf0000000) | ((w & 0x3ffffff) << 2)
+
+def _i_jal(m,w,pc):
+    m.regs[31] = pc+4
+    return ((pc+4) & 0xf0000000) | ((w & 0x3ffffff) << 2)
+
+def _i_beq(m,w,pc):
+    if m.regs[(w >> 21) & 31] == m.regs[(w >> 16) & 31]:
+        return _branch(pc,w)
+    return pc+4
+
+def _i_bne(m,w,pc):
+    if m.regs[(w >> 21) & 31] != m.regs[(w >> 16) & 31]:
+        return _branch(pc,w)
+    return pc+4
+
+def _i_blez(m,w,pc):
+    if _signed(m.regs[(w >> 21) & 31]) <= 0:
+        return _branch(pc,w)
+    return pc+4
+
+def _i_bgtz(m,w,pc):
+    if _signed(m.regs[(w >> 21) & 31]) > 0:
+        return _branch(pc,w)
+    return pc+4
+
+def _i_addi(m,w,pc):
+    val = _signed(m.regs[(w >> 21) & 31])+_simm(w)
+    if not -0x80000000 <= val <= 0x7fffffff:
+        raise MachineError("Arithmetic overflow at {}".format(hex(pc)))
+    m.regs[(w >> 16) & 31] = val & MASK32
+    return pc+4
+
+def _i_addiu(m,w,pc):
+    m.regs[(w >> 16) & 31] = (m.regs[(w >> 21) & 31]+_simm(w)) & MASK32
+    return pc+4
+
+def _i_slti(m,w,pc):
+    m.regs[(w >> 16) & 31] = int(_signed(m.regs[(w >> 21) & 31]) < _simm(w))
+    return pc+4
+
+def _i_sltiu(m,w,pc):
+    m.regs[(w >> 16) & 31] = int(m.regs[(w >> 21) & 31] < (_simm(w) & MASK32))
+    return pc+4
+
+def _i_andi(m,w,pc):
+    m.regs[(w >> 16) & 31] = m.regs[(w >> 21) & 31] & (w & 0xffff)
+    return pc+4
+
+def _i_ori(m,w,pc):
+    m.regs[(w >> 16) & 31] = m.regs[(w >> 21) & 31] | (w & 0xffff)
+    return pc+4
+
+def _i_xori(m,w,pc):
+    m.regs[(w >> 16) & 31] = m.regs[(w >> 21) & 31] ^ (w & 0xffff)
+    return pc+4
+
+def _i_lui(m,w,pc):
+    m.regs[(w >> 16) & 31] = (w & 0xffff) << 16
+    return pc+4
+
+def _addr(m,w)->int:
+    return (m.regs[(w >> 21) & 31]+_simm(w)) & MASK32
+
+def _i_lb(m,w,pc):
+    val = m.mem.read_u8(_addr(m,w))
+    m.regs[(w >> 16) & 31] = (val-((val & 0x80) << 1)) & MASK32
+    return pc+4
+
+def _i_lh(m,w,pc):
+    val = m.mem.read_u16(_addr(m,w))
+    m.regs[(w >> 16) & 31] = (val-((val & 0x8000) << 1)) & MASK32
+    return pc+4
+
+def _i_lw(m,w,pc):
+    m.regs[(w >> 16) & 31] = m.mem.read_u32(_addr(m,w))
+    return pc+4
+
+def _i_lbu(m,w,pc):
+    m.regs[(w >> 16) & 31] = m.mem.read_u8(_addr(m,w))
+    return pc+4
+
+def _i_lhu(m,w,pc):
+    m.regs[(w >> 16) & 31] = m.mem.read_u16(_addr(m,w))
+    return pc+4
+
+def _i_lwl(m,w,pc):
+    addr = _addr(m,w)
+    shift = (3-(addr & 3))*8
+    rt = (w >> 16) & 31
+    m.regs[rt] = (m.regs[rt] & ((1 << shift)-1)) | ((m.mem.read_u32(addr & ~3) << shift) & MASK32)
+    return pc+4
+
+def _i_lwr(m,w,pc):
+    addr = _addr(m,w)
+    shift = (addr & 3)*8
+    rt = (w >> 16) & 31
+    m.regs[rt] = (m.regs[rt] & ~(MASK32 >> shift) & MASK32) | (m.mem.read_u32(addr & ~3) >> shift)
+    return pc+4
+
+def _i_sb(m,w,pc):
+    m.store(_addr(m,w),m.regs[(w >> 16) & 31],1)
+    return pc+4
+
+def _i_sh(m,w,pc):
+    m.store(_addr(m,w),m.regs[(w >> 16) & 31],2)
+    return pc+4
+
+def _i_sw(m,w,pc):
+    m.store(_addr(m,w),m.regs[(w >> 16) & 31],4)
+    return pc+4
+
+def _i_swl(m,w,pc):
+    addr = _addr(m,w)
+    shift = (3-(addr & 3))*8
+    old = m.mem.read_u32(addr & ~3)
+    m.store(addr & ~3,(old & ~(MASK32 >> shift)) | (m.regs[(w >> 16) & 31] >> shift),4)
+    return pc+4
+
+def _i_swr(m,w,pc):
+    addr = _addr(m,w)
+    shift = (addr & 3)*8
+    old = m.mem.read_u32(addr & ~3)
+    m.store(addr & ~3,(old & ((1 << shift)-1)) | ((m.regs[(w >> 16) & 31] << shift) & MASK32),4)
+    return pc+4
+
+def _i_sc(m,w,pc):
+    m.store(_addr(m,w),m.regs[(w >> 16) & 31],4)
+    m.regs[(w >> 16) & 31] = 1
+    return pc+4
+
+SPECIAL_HANDLERS = {0x00:_i_sll,0x02:_i_srl,0x03:_i_sra,0x04:_i_sllv,0x06:_i_srlv,
+        0x07:_i_srav,0x08:_i_jr,0x09:_i_jalr,0x0c:_i_syscall,0x0d:_i_break,
+        0x10:_i_mfhi,0x11:_i_mthi,0x12:_i_mflo,0x13:_i_mtlo,0x18:_i_mult,0x19:_i_multu,
+        0x1a:_i_div,0x1b:_i_divu,0x20:_i_add,0x21:_i_addu,0x22:_i_sub,0x23:_i_subu,
+        0x24:_i_and,0x25:_i_or,0x26:_i_xor,0x27:_i_nor,0x2a:_i_slt,0x2b:_i_sltu}
+SPECIAL2_HANDLERS = {0x00:_i_madd,0x01:_i_maddu,0x02:_i_mul,0x04:_i_msub,0x05:_i_msubu,
+        0x20:_i_clz,0x21:_i_clo}
+OPCODE_HANDLERS = {0x01:_i_regimm,0x02:_i_j,0x03:_i_jal,0x04:_i_beq,0x05:_i_bne,
+        0x06:_i_blez,0x07:_i_bgtz,0x08:_i_addi,0x09:_i_addiu,0x0a:_i_slti,0x0b:_i_sltiu,
+        0x0c:_i_andi,0x0d:_i_ori,0x0e:_i_xori,0x0f:_i_lui,0x20:_i_lb,0x21:_i_lh,
+        0x22:_i_lwl,0x23:_i_lw,0x24:_i_lbu,0x25:_i_lhu,0x26:_i_lwr,0x28:_i_sb,
+        0x29:_i_sh,0x2a:_i_swl,0x2b:_i_sw,0x2e:_i_swr,0x30:_i_lw,0x38:_i_sc}
+
+def _i_reserved(m,w,pc):
+    raise MachineError("Reserved instruction {} at {}".format(hex(w),hex(pc)))
+
+def handler_for(word:int):
+    """
+    Returns the semantic handler(machine, word, pc) -> next pc of @word.
+    """
+    op_code = word >> 26
+    if op_code == 0:
+        return SPECIAL_HANDLERS.get(word & 63,_i_reserved)
+    if op_code == 0x1c:
+        return SPECIAL2_HANDLERS.get(word & 63,_i_reserved)
+    return OPCODE_HANDLERS.get(op_code,_i_reserved)
+
+#
+# Basic block translation
+#
+
+MAX_BLOCK_LEN = 64
+BLOCK_ENDS = {_i_jr,_i_jalr,_i_syscall,_i_break,_i_regimm,_i_j,_i_jal,_i_beq,
+        _i_bne,_i_blez,_i_bgtz,_i_reserved}
+
+def _t_addu(m,w,pc):
+    regs, rs, rt, rd, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, (w >> 11) & 31, pc+4
+    def f():
+        regs[rd] = (regs[rs]+regs[rt]) & MASK32
+        return nxt
+    return f
+
+def _t_subu(m,w,pc):
+    regs, rs, rt, rd, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, (w >> 11) & 31, pc+4
+    def f():
+        regs[rd] = (regs[rs]-regs[rt]) & MASK32
+        return nxt
+    return f
+
+def _t_or(m,w,pc):
+    regs, rs, rt, rd, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, (w >> 11) & 31, pc+4
+    def f():
+        regs[rd] = regs[rs] | regs[rt]
+        return nxt
+    return f
+
+def _t_and(m,w,pc):
+    regs, rs, rt, rd, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, (w >> 11) & 31, pc+4
+    def f():
+        regs[rd] = regs[rs] & regs[rt]
+        return nxt
+    return f
+
+def _t_slt(m,w,pc):
+    regs, rs, rt, rd, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, (w >> 11) & 31, pc+4
+    def f():
+        regs[rd] = int(_signed(regs[rs]) < _signed(regs[rt]))
+        return nxt
+    return f
+
+def _t_sll(m,w,pc):
+    regs, rt, rd, sa, nxt = m.regs, (w >> 16) & 31, (w >> 11) & 31, (w >> 6) & 31, pc+4
+    def f():
+        regs[rd] = (regs[rt] << sa) & MASK32
+        return nxt
+    return f
+
+def _t_addiu(m,w,pc):
+    regs, rs, rt, imm, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, _simm(w), pc+4
+    def f():
+        regs[rt] = (regs[rs]+imm) & MASK32
+        return nxt
+    return f
+
+def _t_ori(m,w,pc):
+    regs, rs, rt, imm, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, w & 0xffff, pc+4
+    def f():
+        regs[rt] = regs[rs] | imm
+        return nxt
+    return f
+
+def _t_lui(m,w,pc):
+    regs, rt, val, nxt = m.regs, (w >> 16) & 31, (w & 0xffff) << 16, pc+4
+    def f():
+        regs[rt] = val
+        return nxt
+    return f
+
+def _t_slti(m,w,pc):
+    regs, rs, rt, imm, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, _simm(w), pc+4
+    def f():
+        regs[rt] = int(_signed(regs[rs]) < imm)
+        return nxt
+    return f
+
+def _t_lw(m,w,pc):
+    regs, read, rs, rt, imm, nxt = m.regs, m.mem.read_u32, (w >> 21) & 31, (w >> 16) & 31, _simm(w), pc+4
+    def f():
+        regs[rt] = read((regs[rs]+imm) & MASK32)
+        return nxt
+    return f
+
+def _t_sw(m,w,pc):
+    regs, store, rs, rt, imm, nxt = m.regs, m.store, (w >> 21) & 31, (w >> 16) & 31, _simm(w), pc+4
+    def f():
+        store((regs[rs]+imm) & MASK32,regs[rt],4)
+        return nxt
+    return f
+
+def _t_beq(m,w,pc):
+    regs, rs, rt, taken, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, _branch(pc,w), pc+4
+    def f():
+        return taken if regs[rs] == regs[rt] else nxt
+    return f
+
+def _t_bne(m,w,pc):
+    regs, rs, rt, taken, nxt = m.regs, (w >> 21) & 31, (w >> 16) & 31, _branch(pc,w), pc+4
+    def f():
+        return taken if regs[rs] != regs[rt] else nxt
+    return f
+
+def _t_generic(m,w,pc):
+    handler, regs = handler_for(w), m.regs
+    def f():
+        nxt = handler(m,w,pc) & MASK32
+        regs[0] = 0
+        return nxt
+    return f
+
+TRANSLATORS = {_i_addu:_t_addu,_i_subu:_t_subu,_i_or:_t_or,_i_and:_t_and,_i_slt:_t_slt,
+        _i_sll:_t_sll,_i_addiu:_t_addiu,_i_ori:_t_ori,_i_lui:_t_lui,_i_slti:_t_slti,
+        _i_lw:_t_lw,_i_sw:_t_sw,_i_beq:_t_beq,_i_bne:_t_bne}
+# translators writing a register rely on the destination not being $zero
+_WRITES_RD = {_i_addu,_i_subu,_i_or,_i_and,_i_slt,_i_sll}
+_WRITES_RT = {_i_addiu,_i_ori,_i_lui,_i_slti,_i_lw}
+
+def translate(m:object,word:int,pc:int):
+    """
+    Returns a closure executing @word at @pc on machine @m, which
+    returns the next pc.
+    """
+    handler = handler_for(word)
+    factory = TRANSLATORS.get(handler)
+    if factory is None or (handler in _WRITES_RD and (word >> 11) & 31 == 0) or \
+            (handler in _WRITES_RT and (word >> 16) & 31 == 0):
+        return _t_generic(m,word,pc)
+    return factory(m,word,pc)
+
+class Block(object):
+    """
+    Straight-line run of translated instructions ending at a control
+    transfer, a page boundary or MAX_BLOCK_LEN instructions.
+    """
+    __slots__ = ("start","end","ops")
+
+    def __init__(self:object,start:int,ops:list)->None:
+        self.start = start
+        self.end = start+4*len(ops)
+        self.ops = ops
+
+#
+# Profiling
+#
+
+BRANCH_HANDLERS = {_i_regimm,_i_beq,_i_bne,_i_blez,_i_bgtz}
+# opcodes counted as memory reads/writes, ll (0x30) and sc (0x38) included
+LOAD_OPCODES = frozenset((0x20,0x21,0x22,0x23,0x24,0x25,0x26,0x30))
+STORE_OPCODES = frozenset((0x28,0x29,0x2a,0x2b,0x2e,0x38))
+PROFILE_MAGIC = b"MPRF"
+_PROFILE_HEADER = struct.Struct("<4sHHII")
+
+class Profile(object):
+    """
+    Execution profile filled by Machine.run() while it is attached as
+    Machine.profile: executions and taken control transfers per PC and
+    loads/stores per memory bucket of 2**@bucket_bits bytes.
+    """
+    def __init__(self:object,bucket_bits:int=PAGE_BITS)->None:
+        self.bucket_bits = bucket_bits
+        self.clear()
+
+    def clear(self:object)->None:
+        self.counts = defaultdict(int)
+        self.jumps = defaultdict(int)
+        self.reads = defaultdict(int)
+        self.writes = defaultdict(int)
+
+    def to_arrays(self:object,mem:Memory)->dict:
+        """
+        Packs the profile into flat arrays sorted by PC and bucket. The
+        instruction word of every PC is read from @mem so the result
+        can be reported without the machine.
+        """
+        pcs = sorted(self.counts)
+        buckets = sorted(self.reads.keys() | self.writes.keys())
+        return {"bucket_bits":self.bucket_bits,
+                "pcs":array("I",pcs),
+                "words":array("I",[mem.read_u32(pc) for pc in pcs]),
+                "counts":array("Q",[self.counts[pc] for pc in pcs]),
+                "taken":array("Q",[self.jumps.get(pc,0) for pc in pcs]),
+                "buckets":array("I",buckets),
+                "reads":array("Q",[self.reads.get(b,0) for b in buckets]),
+                "writes":array("Q",[self.writes.get(b,0) for b in buckets])}
+
+PROFILE_ARRAYS = (("pcs","I"),("words","I"),("counts","Q"),("taken","Q"))
+PROFILE_BUCKET_ARRAYS = (("buckets","I"),("reads","Q"),("writes","Q"))
+
+def save_profile(file_name:str,arrays:dict)->None:
+    """
+    Writes the arrays of Profile.to_arrays() as little endian binary.
+    """
+    with open(file_name,"wb") as fd:
+        fd.write(_PROFILE_HEADER.pack(PROFILE_MAGIC,1,arrays["bucket_bits"],
+            len(arrays["pcs"]),len(arrays["buckets"])))
+        for name, typecode in PROFILE_ARRAYS+PROFILE_BUCKET_ARRAYS:
+            data = array(typecode,arrays[name])
+            if sys.byteorder == "big":
+                data.byteswap()
+            fd.write(data.tobytes())
+
+def load_profile(file_name:str)->dict:
+    with open(file_name,"rb") as fd:
+        raw = fd.read()
+    magic, version, bucket_bits, n_pcs, n_buckets = _PROFILE_HEADER.unpack_from(raw,0)
+    if magic != PROFILE_MAGIC or version != 1:
+        raise ValueError("{} is not a profile".format(file_name))
+    arrays = {"bucket_bits":bucket_bits}
+    offset = _PROFILE_HEADER.size
+    for (name, typecode), count in [(a,n_pcs) for a in PROFILE_ARRAYS]+ \
+            [(a,n_buckets) for a in PROFILE_BUCKET_ARRAYS]:
+        data = array(typecode)
+        data.frombytes(raw[offset:offset+count*data.itemsize])
+        if sys.byteorder == "big":
+            data.byteswap()
+        arrays[name] = data
+        offset += count*data.itemsize
+    return arrays
+
+def mnemonic_counts(arrays:dict)->dict:
+    counts = defaultdict(int)
+    for word, count in zip(arrays["words"],arrays["counts"]):
+        counts[decode_instruction(word).name] += count
+    return dict(sorted(counts.items(),key=lambda item:-item[1]))
+
+def hot_spots(arrays:dict,top:int=20)->list:
+    """
+    Annotated listing of the @top most executed instructions, one line
+    per PC with the same text as the mips32_disassembler output:
+    address, count, share of all executions, taken/not taken for
+    conditional branches and the instruction.
+    """
+    total = sum(arrays["counts"]) or 1
+    order = sorted(range(len(arrays["pcs"])),key=lambda i:-arrays["counts"][i])[:top]
+    lines = list()
+    for i in order:
+        word, count = arrays["words"][i], arrays["counts"][i]
+        branch = ""
+        if handler_for(word) in BRANCH_HANDLERS:
+            taken = arrays["taken"][i]
+            branch = "taken {} / not taken {}".format(taken,count-taken)
+        lines.append("{:#010x} {:>12} {:6.2%} {:<28} {}".format(
+            arrays["pcs"][i],count,count/total,branch,mips_decode(word)))
+    return lines
+
+class Snapshot(object):
+    """
+    Machine state saved by Machine.checkpoint().
+    """
+    __slots__ = ("regs","hi","lo","pc","pages","brk","halted","exit_code","output")
+
+    def __init__(self:object,m:object)->None:
+        self.regs = list(m.regs)
+        self.hi, self.lo, self.pc = m.hi, m.lo, m.pc
+        self.pages = m.mem.checkpoint()
+        self.brk = m.brk
+        self.halted, self.exit_code = m.halted, m.exit_code
+        self.output = list(m.output)
+
+class Machine(object):
+    """
+    In-process MIPS32 machine: register file, HI/LO, PC and sparse
+    paged memory. Branches have no delay slot, like spim's default.
+    With @translate, run() executes cached basic blocks of closures
+    instead of decoding every instruction.
+    """
+    def __init__(self:object,input_cb=None,translate:bool=True)->None:
+        self.input_cb = input_cb if input_cb is not None else sys.stdin.readline
+        self.translate = translate
+        self.profile = None
+        self.reset()
+
+    def reset(self:object)->None:
+        self.regs = [0]*32
+        self.regs[28] = GP_INIT
+        self.regs[29] = STACK_TOP
+        self.hi = self.lo = 0
+        self.pc = TEXT_BASE
+        self.mem = Memory()
+        self.output = list()
+        self.halted = False
+        self.exit_code = None
+        self.steps = 0
+        self.brk = DATA_BASE
+        self.blocks = {}
+        self.code_pages = {}
+        # block being executed by _run_blocks, stale once a store rewrites it
+        self.running = None
+        self.stale = False
+        self.blocks_translated = 0
+        self.block_hits = 0
+        self.invalidations = 0
+        self.restores = 0
+        self.run_time = 0.0
+
+    def load(self:object,prog:Program)->None:
+        """
+        Places @prog in memory behind a startup stub that calls main
+        and exits, the same layout spim uses.
+        """
+        self.reset()
+        stub = assemble_stub(prog.entry)
+        for i, word in enumerate(stub):
+            self.mem.write_u32(TEXT_BASE+4*i,word)
+        for i, word in enumerate(prog.text):
+            self.mem.write_u32(USER_TEXT_BASE+4*i,word)
+        self.mem.write_bytes(DATA_BASE,prog.data)
+        self.brk = (DATA_BASE+len(prog.data)+7) & ~7
+        self.pc = TEXT_BASE
+
+    def store(self:object,addr:int,val:int,size:int)->None:
+        if addr >> PAGE_BITS in self.code_pages:
+            self.invalidate(addr,size)
+        if size == 4:
+            self.mem.write_u32(addr,val)
+        elif size == 2:
+            self.mem.write_u16(addr,val)
+        else:
+            self.mem.write_u8(addr,val)
+
+    def syscall(self:object)->None:
+        code = self.regs[2]
+        a0 = self.regs[4]
+        if code == SYSCALL_PRINT_INT:
+            self.output.append(str(_signed(a0)))
+        elif code == SYSCALL_PRINT_STRING:
+            self.output.append(self.mem.read_cstring(a0).decode("latin-1"))
+        elif code == SYSCALL_PRINT_CHAR:
+            self.output.append(chr(a0 & 0xff))
+        elif code == SYSCALL_READ_INT:
+            self.regs[2] = int(self.input_cb().strip() or 0) & MASK32
+        elif code == SYSCALL_READ_CHAR:
+            self.regs[2] = ord((self.input_cb() or "\0")[0])
+        elif code == SYSCALL_READ_STRING:
+            data = self.input_cb().encode("latin-1")[:max(0,self.regs[5]-1)]
+            for i, byte in enumerate(data+b"\0"):
+                self.store(a0+i,byte,1)
+        elif code == SYSCALL_SBRK:
+            self.regs[2] = self.brk
+            self.brk = (self.brk+_signed(a0)+7) & ~7
+        elif code == SYSCALL_EXIT:
+            self.halted = True
+            self.exit_code = 0
+        elif code == SYSCALL_EXIT2:
+            self.halted = True
+            self.exit_code = _signed(a0)
+        else:
+            raise MachineError("Unknown syscall {}".format(code))
+
+    def step(self:object)->None:
+        pc = self.pc
+        word = self.mem.read_u32(pc)
+        self.pc = handler_for(word)(self,word,pc) & MASK32
+        self.regs[0] = 0
+        self.steps += 1
+
+    def invalidate(self:object,addr:int,size:int)->None:
+        """
+        Drops the translated blocks overlapping a write of @size bytes
+        at @addr.
+        """
+        starts = self.code_pages.get(addr >> PAGE_BITS,())
+        for start in [s for s in starts if s < addr+size and addr < self.blocks[s].end]:
+            starts.discard(start)
+            if self.blocks.pop(start) is self.running:
+                self.stale = True
+            self.invalidations += 1
+
+    def checkpoint(self:object)->Snapshot:
+        """
+        Saves registers, memory and PC. Memory pages become
+        copy-on-write, so taking a snapshot does not copy them.
+        """
+        return Snapshot(self)
+
+    def restore(self:object,snap:Snapshot)->None:
+        """
+        Returns to the state saved in @snap. The cost is proportional to
+        the pages written since the last checkpoint or restore.
+        Translated blocks survive unless their page was written.
+        """
+        self.regs[:] = snap.regs
+        self.hi, self.lo, self.pc = snap.hi, snap.lo, snap.pc
+        self.brk = snap.brk
+        self.halted, self.exit_code = snap.halted, snap.exit_code
+        self.output[:] = snap.output
+        for num in self.mem.restore(snap.pages):
+            if num in self.code_pages:
+                self.invalidate(num << PAGE_BITS,PAGE_SIZE)
+        self.restores += 1
+
+    def translate_block(self:object,pc:int)->Block:
+        ops = list()
+        addr = pc
+        while True:
+            word = self.mem.read_u32(addr)
+            ops.append((addr,translate(self,word,addr)))
+            addr += 4
+            if handler_for(word) in BLOCK_ENDS or len(ops) >= MAX_BLOCK_LEN or \
+                    not addr & PAGE_MASK:
+                break
+        block = Block(pc,ops)
+        self.blocks[pc] = block
+        self.code_pages.setdefault(pc >> PAGE_BITS,set()).add(pc)
+        self.blocks_translated += 1
+        return block
+
+    def _run_blocks(self:object,budget:int,deadline:float)->None:
+        blocks = self.blocks
+        pc = self.pc
+        rounds = 0
+        ops = ()
+        try:
+            while not self.halted:
+                ops = ()
+                block = blocks.get(pc)
+                if block is None:
+                    block = self.translate_block(pc)
+                else:
+                    self.block_hits += 1
+                ops = block.ops
+                if budget is not None and len(ops) > budget:
+                    self.pc = pc
+                    if budget > 0:
+                        self.run_single(budget,None)
+                    pc = self.pc
+                    return
+                self.running = block
+                for pc, op in ops:
+                    nxt = op()
+                    if self.stale:
+                        # the block rewrote itself, its remaining ops are
+                        # stale: leave and dispatch again behind the store
+                        break
+                done = (pc-block.start >> 2)+1
+                pc = nxt
+                self.stale = False
+                self.steps += done
+                if budget is not None:
+                    budget -= done
+                rounds += 1
+                if deadline is not None and not rounds & 1023 and time.monotonic() > deadline:
+                    break
+        except MachineError:
+            addrs = [addr for addr, op in ops]
+            if pc in addrs:
+                self.steps += addrs.index(pc)
+            raise
+        finally:
+            self.running = None
+            self.stale = False
+            self.pc = pc & MASK32
+
+    def stats(self:object)->dict:
+        return {"instructions":self.steps,"blocks_translated":self.blocks_translated,
+                "block_hits":self.block_hits,"invalidations":self.invalidations,
+                "restores":self.restores,
+                "seconds":self.run_time,
+                "ips":self.steps/self.run_time if self.run_time else 0.0}
+
+    def run(self:object,max_steps:int=None,timeout:float=None)->bool:
+        """
+        Executes until the program exits, @max_steps instructions were
+        executed or @timeout seconds passed.
+        :return: True if the program halted
+        """
+        deadline = time.monotonic()+timeout if timeout is not None else None
+        start = time.perf_counter()
+        try:
+            if self.profile is not None:
+                self._run_profiled(max_steps,deadline)
+            elif self.translate:
+                self._run_blocks(max_steps,deadline)
+            else:
+                self.run_single(max_steps,deadline)
+        finally:
+            self.run_time += time.perf_counter()-start
+        return self.halted
+
+    def run_until(self:object,addr:int,max_steps:int=None)->bool:
+        """
+        Single steps until the PC reaches @addr, the program exits or
+        @max_steps instructions were executed.
+        :return: True if @addr was reached
+        """
+        steps = 0
+        while not self.halted and self.pc != addr:
+            if max_steps is not None and steps >= max_steps:
+                break
+            self.step()
+            steps += 1
+        return self.pc == addr and not self.halted
+
+    def run_single(self:object,max_steps:int=None,deadline:float=None)->None:
+        """
+        Plain fetch, decode and execute loop without translation.
+        """
+        budget = max_steps
+        mem, regs = self.mem, self.regs
+        while not self.halted:
+            chunk = 1 << 14 if budget is None else min(budget,1 << 14)
+            if chunk <= 0:
+                break
+            pc = self.pc
+            done = 0
+            try:
+                while done < chunk and not self.halted:
+                    word = mem.read_u32(pc)
+                    pc = handler_for(word)(self,word,pc) & MASK32
+                    regs[0] = 0
+                    done += 1
+            finally:
+                self.pc = pc
+                self.steps += done
+            if budget is not None:
+                budget -= done
+            if deadline is not None and time.monotonic() > deadline:
+                break
+
+    def _run_profiled(self:object,max_steps:int=None,deadline:float=None)->None:
+        """
+        run_single() with the bookkeeping of self.profile. Only used
+        while a profile is attached.
+        """
+        prof = self.profile
+        counts, jumps, reads, writes = prof.counts, prof.jumps, prof.reads, prof.writes
+        bits = prof.bucket_bits
+        budget = max_steps
+        mem, regs = self.mem, self.regs
+        while not self.halted:
+            chunk = 1 << 14 if budget is None else min(budget,1 << 14)
+            if chunk <= 0:
+                break
+            pc = self.pc
+            done = 0
+            try:
+                while done < chunk and not self.halted:
+                    word = mem.read_u32(pc)
+                    op = word >> 26
+                    if op in LOAD_OPCODES:
+                        reads[(regs[(word >> 21) & 31]+_simm(word)) & MASK32 >> bits] += 1
+                    elif op in STORE_OPCODES:
+                        writes[(regs[(word >> 21) & 31]+_simm(word)) & MASK32 >> bits] += 1
+                    nxt = handler_for(word)(self,word,pc) & MASK32
+                    regs[0] = 0
+                    counts[pc] += 1
+                    if nxt != pc+4:
+                        jumps[pc] += 1
+                    pc = nxt
+                    done += 1
+            finally:
+                self.pc = pc
+                self.steps += done
+            if budget is not None:
+                budget -= done
+            if deadline is not None and time.monotonic() > deadline:
+                break
+
+    def register_dump(self:object)->array:
+        """
+        All registers in one array laid out as DUMP_NAMES.
+        """
+        dump = array("I",self.regs)
+        dump.extend((self.hi,self.lo,self.pc))
+        return dump
+
+    def memory_dump(self:object,ranges:list)->list:
+        """
+        Returns the bytes of every (addr, size) pair in @ranges.
+        """
+        return [self.mem.read_bytes(addr,size) for addr, size in ranges]
+
+    def read_output(self:object)->str:
+        out = "".join(self.output)
+        self.output.clear()
+        return out
+
+def assemble_stub(entry:int)->list:
+    """
+    Startup code at TEXT_BASE: jal @entry, then exit via syscall 10.
+    """
+    return [(0x03 << 26) | ((entry >> 2) & 0x3ffffff),
+            (0x0d << 26) | (2 << 16) | SYSCALL_EXIT,
+            0x0000000c]
@@ -1,84 +1,837 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import struct, argparse, os, sys
-from binascii import hexlify, unhexlify
+import struct, argparse, os, sys, mmap, json, time, hashlib, sqlite3
+from bisect import bisect_right
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+
+DOS_MAGIC = b"MZ"
+PE_SIGNATURE = b"PE\0\0"
+PE32_MAGIC = 0x10b
+PE32PLUS_MAGIC = 0x20b
+MACHINE_NAMES = {0x14c:"i386 32 bit (0x014c)",0x8664:"i386 64 bit (0x8664)",
+    0xaa64:"ARM64 (0xaa64)"}
+DATA_DIR_NAMES = ("Export symbols table","Import symbols table","Resource table",
+    "Exception table","Certificate table","Base relocation table","Debugging information",
+    "Architecture-specific data","Global pointer register","Thread local storage table",
+    "Load configuration table","Bound import table","Import address table",
+    "Delay import descriptor","CLR header","Reserved")
+DIR_EXPORT = 0
+DIR_IMPORT = 1
+DIR_BOUND_IMPORT = 11
+DIR_DELAY_IMPORT = 13
+TRIAGE_BATCH = 64
+# version of the pe_record() layout and of the cache schema, caches of
+# other versions are dropped
+RECORD_VERSION = 3
+MAX_NAME = 4096
+MAX_DESCRIPTORS = 4096
+MAX_THUNKS = 1 << 16
+
+# Precompiled little endian layouts, each header is decoded with one call
+DOS_HDR = struct.Struct("<2s13H8sHH20sI")
+FILE_HDR = struct.Struct("<HHIIIHH")
+OPT_MAGIC = struct.Struct("<H")
+OPT_HDR32 = struct.Struct("<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII")
+OPT_HDR64 = struct.Struct("<HBBIIIIIQIIHHHHHHIIIIHHQQQQII")
+SEC_HDR = struct.Struct("<8sIIIIIIHHI")
+DATA_DIR = struct.Struct("<II")
+IMPORT_DESC = struct.Struct("<IIIII")
+DELAY_DESC = struct.Struct("<IIIIIIII")
+BOUND_DESC = struct.Struct("<IHH")
+EXPORT_DIR = struct.Struct("<IIHHIIIIIII")
+THUNK32 = struct.Struct("<I")
+THUNK64 = struct.Struct("<Q")
+HINT = struct.Struct("<H")
+
+DosHeader = namedtuple("DosHeader",["magic","bytes_last_page","pages_in_file","relocations",
+    "header_paragraphs","min_alloc","max_alloc","init_ss","init_sp","checksum","init_ip",
+    "init_cs","reloc_offset","overlay","reserved","oem_id","oem_info","reserved2","pe_offset"])
+FileHeader = namedtuple("FileHeader",["machine","num_sections","time_date_stamp","sym_table",
+    "num_symbols","size_opt_hdr","characteristics"])
+OptionalHeader = namedtuple("OptionalHeader",["magic","major_linker","minor_linker","code_size",
+    "init_size","uninit_size","entry_point","base_of_code","base_of_data","image_base",
+    "section_alignment","file_alignment","major_os","minor_os","major_image","minor_image",
+    "major_subsystem","minor_subsystem","win32_version","image_size","headers_size","checksum",
+    "subsystem","dll_characteristics","stack_reserve","stack_commit","heap_reserve",
+    "heap_commit","loader_flags","num_rva_sizes"])
+# PE32+ drops base_of_data and widens image base, stack and heap sizes
+OptionalHeader64 = namedtuple("OptionalHeader64",[f for f in OptionalHeader._fields if f != "base_of_data"])
+SectionHeader = namedtuple("SectionHeader",["name","virtual_size","virtual_address","raw_size",
+    "raw_offset","reloc_offset","lineno_offset","num_relocs","num_linenos","characteristics"])
+DataDirectory = namedtuple("DataDirectory",["rva","size"])
+PEHeaders = namedtuple("PEHeaders",["dos","file","optional","sections"])
+OPT_LAYOUTS = {PE32_MAGIC:(OPT_HDR32,OptionalHeader),PE32PLUS_MAGIC:(OPT_HDR64,OptionalHeader64)}
+Import = namedtuple("Import",["dll","name","ordinal","hint","iat_rva","delayed"])
+Export = namedtuple("Export",["ordinal","name","rva","forwarder"])
+BoundImport = namedtuple("BoundImport",["dll","time_date_stamp","forwarders"])
+
+class PEFormatError(Exception):
+    pass
+
+class MappedFile(object):
+    """
+    Read-only memory map of a file exposed as a memoryview. Only the
+    pages that are actually parsed get read from disk.
+    """
+    def __init__(self:object,fname:str)->None:
+        self.fd = open(fname,"rb")
+        try:
+            self.map = mmap.mmap(self.fd.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError:
+            self.fd.close()
+            raise PEFormatError("{} is empty".format(fname))
+        self.view = memoryview(self.map)
+
+    def close(self:object)->None:
+        self.view.release()
+        self.map.close()
+        self.fd.close()
+
+    def __enter__(self:object)->memoryview:
+        return self.view
+
+    def __exit__(self:object,*exc)->None:
+        self.close()
+
+def _unpack_from(layout:struct.Struct,view:memoryview,offset:int,what:str)->tuple:
+    try:
+        return layout.unpack_from(view,offset)
+    except struct.error:
+        raise PEFormatError("truncated {} at offset {}".format(what,hex(offset)))
+
+def _unpack(layout:struct.Struct,record:type,view:memoryview,offset:int,what:str)->tuple:
+    return record._make(_unpack_from(layout,view,offset,what))
+
+def parse_dos_hdr(view:memoryview)->DosHeader:
+    dos = _unpack(DOS_HDR,DosHeader,view,0,"DOS header")
+    if dos.magic != DOS_MAGIC:
+        raise PEFormatError("no MZ signature")
+    return dos
+
+def parse_file_hdr(view:memoryview,pe_offset:int)->FileHeader:
+    if bytes(view[pe_offset:pe_offset+4]) != PE_SIGNATURE:
+        raise PEFormatError("no PE signature at offset {}".format(hex(pe_offset)))
+    return _unpack(FILE_HDR,FileHeader,view,pe_offset+4,"file header")
+
+def opt_layout(view:memoryview,offset:int)->tuple:
+    """
+    (Struct, record type) of the optional header at @offset, chosen by
+    its PE32 or PE32+ magic.
+    """
+    try:
+        magic = OPT_MAGIC.unpack_from(view,offset)[0]
+    except struct.error:
+        raise PEFormatError("truncated optional header at offset {}".format(hex(offset)))
+    if magic not in OPT_LAYOUTS:
+        raise PEFormatError("optional header magic {} not found".format(hex(magic)))
+    return OPT_LAYOUTS[magic]
+
+def parse_opt_hdr(view:memoryview,offset:int)->tuple:
+    """
+    :return: OptionalHeader or OptionalHeader64
+    """
+    layout, record = opt_layout(view,offset)
+    return _unpack(layout,record,view,offset,"optional header")
+
+def opt_hdr_size(opt:tuple)->int:
+    """
+    Size of the fixed part of @opt, where the data directories start.
+    """
+    return OPT_LAYOUTS[opt.magic][0].size
+
+def parse_sec_hdrs(view:memoryview,offset:int,count:int)->tuple:
+    return tuple(_unpack(SEC_HDR,SectionHeader,view,offset+i*SEC_HDR.size,"section header")
+            for i in range(count))
+
+def parse_data_dirs(view:memoryview,offset:int,count:int)->tuple:
+    count = min(count,len(DATA_DIR_NAMES))
+    return tuple(_unpack(DATA_DIR,DataDirectory,view,offset+i*DATA_DIR.size,"data directory")
+            for i in range(count))
+
+def parse_headers(view:memoryview)->PEHeaders:
+    """
+    Decodes DOS, file and optional header and the section table of the
+    image in @view, touching nothing behind the section table.
+    """
+    dos = parse_dos_hdr(view)
+    file_hdr = parse_file_hdr(view,dos.pe_offset)
+    opt_offset = dos.pe_offset+4+FILE_HDR.size
+    optional = parse_opt_hdr(view,opt_offset) if file_hdr.size_opt_hdr else None
+    sections = parse_sec_hdrs(view,opt_offset+file_hdr.size_opt_hdr,file_hdr.num_sections)
+    return PEHeaders(dos,file_hdr,optional,sections)
+
+def read_headers(fname:str)->PEHeaders:
+    with MappedFile(fname) as view:
+        return parse_headers(view)
+
+def section_name(sec:SectionHeader)->str:
+    return sec.name.rstrip(b"\0").decode("ascii","replace")
+
+class PEImage(object):
+    """
+    Memory-mapped PE file. DOS, file and optional header are decoded on
+    open; the section table and the data directories only when first
+    used. RVA and file offset translation bisects sorted section
+    intervals.
+    """
+    def __init__(self:object,fname:str)->None:
+        self.fname = fname
+        self.mapped = MappedFile(fname)
+        self.view = self.mapped.view
+        try:
+            self.dos = parse_dos_hdr(self.view)
+            self.file = parse_file_hdr(self.view,self.dos.pe_offset)
+            self.opt_offset = self.dos.pe_offset+4+FILE_HDR.size
+            self.optional = parse_opt_hdr(self.view,self.opt_offset) if self.file.size_opt_hdr else None
+        except PEFormatError:
+            self.close()
+            raise
+        if self.optional is not None and self.optional.magic == PE32PLUS_MAGIC:
+            self.thunk, self.ordinal_flag = THUNK64, 1 << 63
+        else:
+            self.thunk, self.ordinal_flag = THUNK32, 1 << 31
+        self._sections = None
+        self._data_dirs = None
+        self._rva_index = None
+        self._offset_index = None
+
+    def close(self:object)->None:
+        self.mapped.close()
+
+    def __enter__(self:object)->object:
+        return self
+
+    def __exit__(self:object,*exc)->None:
+        self.close()
+
+    @property
+    def sections(self:object)->tuple:
+        if self._sections is None:
+            self._sections = parse_sec_hdrs(self.view,self.opt_offset+self.file.size_opt_hdr,
+                    self.file.num_sections)
+        return self._sections
+
+    @property
+    def data_dirs(self:object)->tuple:
+        if self._data_dirs is None:
+            self._data_dirs = ()
+            if self.optional is not None:
+                fixed = opt_hdr_size(self.optional)
+                count = min(self.optional.num_rva_sizes,(self.file.size_opt_hdr-fixed)//DATA_DIR.size)
+                self._data_dirs = parse_data_dirs(self.view,self.opt_offset+fixed,count)
+        return self._data_dirs
+
+    def data_dir(self:object,index:int)->DataDirectory:
+        """
+        Data directory @index (see DATA_DIR_NAMES), None if absent or empty.
+        """
+        dirs = self.data_dirs
+        if index >= len(dirs) or not (dirs[index].rva or dirs[index].size):
+            return None
+        return dirs[index]
+
+    @property
+    def headers(self:object)->PEHeaders:
+        return PEHeaders(self.dos,self.file,self.optional,self.sections)
+
+    def _build_index(self:object)->None:
+        by_rva = sorted(self.sections,key=lambda sec:sec.virtual_address)
+        self._rva_index = ([sec.virtual_address for sec in by_rva],by_rva)
+        by_offset = sorted((sec for sec in self.sections if sec.raw_size),
+                key=lambda sec:sec.raw_offset)
+        self._offset_index = ([sec.raw_offset for sec in by_offset],by_offset)
+
+    def section_for_rva(self:object,rva:int)->SectionHeader:
+        if self._rva_index is None:
+            self._build_index()
+        starts, secs = self._rva_index
+        idx = bisect_right(starts,rva)-1
+        if idx < 0:
+            return None
+        sec = secs[idx]
+        if rva < sec.virtual_address+max(sec.virtual_size,sec.raw_size):
+            return sec
+        return None
+
+    def rva_to_offset(self:object,rva:int)->int:
+        """
+        File offset of @rva, None if it is not backed by file data.
+        """
+        sec = self.section_for_rva(rva)
+        if sec is None:
+            headers_size = self.optional.headers_size if self.optional else 0
+            return rva if rva < min(headers_size,len(self.view)) else None
+        delta = rva-sec.virtual_address
+        if delta >= sec.raw_size:
+            return None
+        return sec.raw_offset+delta
+
+    def offset_to_rva(self:object,offset:int)->int:
+        if self._offset_index is None:
+            self._build_index()
+        starts, secs = self._offset_index
+        idx = bisect_right(starts,offset)-1
+        if idx >= 0 and offset < secs[idx].raw_offset+secs[idx].raw_size:
+            return secs[idx].virtual_address+offset-secs[idx].raw_offset
+        headers_size = self.optional.headers_size if self.optional else 0
+        return offset if offset < headers_size else None
+
+    def read_rva(self:object,rva:int,size:int)->memoryview:
+        """
+        Zero-copy view of @size bytes at @rva, cut at the end of the
+        file data of its section.
+        """
+        offset = self.rva_to_offset(rva)
+        if offset is None:
+            raise PEFormatError("RVA {} is not mapped to file data".format(hex(rva)))
+        sec = self.section_for_rva(rva)
+        end = sec.raw_offset+sec.raw_size if sec is not None else len(self.view)
+        return self.view[offset:min(offset+size,end)]
+
+    def read_cstring(self:object,rva:int,limit:int=MAX_NAME)->str:
+        """
+        NUL terminated ASCII string at @rva as an interned str.
+        """
+        offset = self.rva_to_offset(rva)
+        if offset is None:
+            raise PEFormatError("RVA {} is not mapped to file data".format(hex(rva)))
+        end = self.mapped.map.find(b"\0",offset,offset+limit)
+        if end < 0:
+            raise PEFormatError("unterminated string at RVA {}".format(hex(rva)))
+        return sys.intern(str(self.view[offset:end],"ascii","replace"))
+
+    def _iter_thunks(self:object,rva:int):
+        """
+        Yields (index, value) of the zero terminated thunk array at @rva.
+        """
+        size = self.thunk.size
+        view = self.read_rva(rva,MAX_THUNKS*size)
+        for index, (value,) in enumerate(self.thunk.iter_unpack(view[:len(view)//size*size])):
+            if not value:
+                return
+            yield index, value
+
+    def _iter_import_entries(self:object,dll:str,lookup_rva:int,iat_rva:int,delayed:bool,
+            base:int=0):
+        for index, value in self._iter_thunks(lookup_rva or iat_rva):
+            if value & self.ordinal_flag:
+                yield Import(dll,None,value & 0xffff,None,iat_rva+index*self.thunk.size,delayed)
+                continue
+            hint_rva = (value-base) & 0x7fffffff
+            hint = _unpack_from(HINT,self.read_rva(hint_rva,HINT.size),0,
+                    "import hint at RVA {}".format(hex(hint_rva)))[0]
+            yield Import(dll,self.read_cstring(hint_rva+HINT.size),None,hint,
+                    iat_rva+index*self.thunk.size,delayed)
+
+    def _iter_descriptors(self:object,index:int,layout:struct.Struct):
+        data_dir = self.data_dir(index)
+        if data_dir is None:
+            return
+        view = self.read_rva(data_dir.rva,MAX_DESCRIPTORS*layout.size)
+        for desc in layout.iter_unpack(view[:len(view)//layout.size*layout.size]):
+            if not any(desc):
+                return
+            yield desc
+
+    def iter_imports(self:object):
+        """
+        Streams the import table as Import records, one per imported
+        function. DLL names are lower case, all names are interned.
+        """
+        for lookup_rva, stamp, chain, name_rva, iat_rva in self._iter_descriptors(DIR_IMPORT,IMPORT_DESC):
+            dll = sys.intern(self.read_cstring(name_rva).lower())
+            yield from self._iter_import_entries(dll,lookup_rva,iat_rva,False)
+
+    def iter_delay_imports(self:object):
+        """
+        Like iter_imports() for the delay load descriptors. Old style
+        descriptors store virtual addresses instead of RVAs.
+        """
+        image_base = self.optional.image_base if self.optional else 0
+        for desc in self._iter_descriptors(DIR_DELAY_IMPORT,DELAY_DESC):
+            attrs, name_rva, module, iat_rva, lookup_rva = desc[:5]
+            base = 0 if attrs & 1 else image_base
+            dll = sys.intern(self.read_cstring((name_rva-base) & 0xffffffff).lower())
+            yield from self._iter_import_entries(dll,(lookup_rva-base) & 0xffffffff if lookup_rva else 0,
+                    (iat_rva-base) & 0xffffffff,True,base)
+
+    def iter_bound_imports(self:object):
+        """
+        Streams the bound import directory as BoundImport records.
+        """
+        data_dir = self.data_dir(DIR_BOUND_IMPORT)
+        if data_dir is None:
+            return
+        view = self.read_rva(data_dir.rva,data_dir.size)
+        offset = 0
+        for i in range(MAX_DESCRIPTORS):
+            try:
+                stamp, name_off, refs = BOUND_DESC.unpack_from(view,offset)
+            except struct.error:
+                return
+            if not (stamp or name_off or refs):
+                return
+            forwarders = list()
+            for j in range(refs):
+                ref_stamp, ref_name, reserved = _unpack_from(BOUND_DESC,view,offset+(j+1)*BOUND_DESC.size,
+                        "bound forwarder ref")
+                forwarders.append((self.read_cstring(data_dir.rva+ref_name).lower(),ref_stamp))
+            yield BoundImport(self.read_cstring(data_dir.rva+name_off).lower(),stamp,tuple(forwarders))
+            offset += (refs+1)*BOUND_DESC.size
+
+    def _export_dir(self:object)->tuple:
+        data_dir = self.data_dir(DIR_EXPORT)
+        if data_dir is None:
+            return None
+        try:
+            return EXPORT_DIR.unpack_from(self.read_rva(data_dir.rva,EXPORT_DIR.size))
+        except struct.error:
+            raise PEFormatError("truncated export directory at RVA {}".format(hex(data_dir.rva)))
+
+    def export_name(self:object)->str:
+        fields = self._export_dir()
+        return self.read_cstring(fields[4]) if fields is not None else None
+
+    def iter_exports(self:object):
+        """
+        Streams the export directory as Export records in ordinal order.
+        Exports pointing into the directory itself are forwarders.
+        """
+        fields = self._export_dir()
+        if fields is None:
+            return
+        data_dir = self.data_dir(DIR_EXPORT)
+        base, num_funcs, num_names, funcs_rva, names_rva, ords_rva = fields[5:]
+        num_funcs, num_names = min(num_funcs,MAX_THUNKS), min(num_names,MAX_THUNKS)
+        names = {}
+        if num_names:
+            try:
+                name_rvas = struct.unpack("<{}I".format(num_names),self.read_rva(names_rva,4*num_names))
+                ordinals = struct.unpack("<{}H".format(num_names),self.read_rva(ords_rva,2*num_names))
+            except struct.error:
+                raise PEFormatError("truncated export name table at RVA {}".format(hex(names_rva)))
+            for name_rva, index in zip(name_rvas,ordinals):
+                names[index] = self.read_cstring(name_rva)
+        funcs = self.read_rva(funcs_rva,4*num_funcs)
+        for index, (rva,) in enumerate(THUNK32.iter_unpack(funcs[:len(funcs)//4*4])):
+            if not rva:
+                continue
+            forwarder = None
+            if data_dir.rva <= rva < data_dir.rva+data_dir.size:
+                forwarder = self.read_cstring(rva)
+            yield Export(base+index,names.get(index),rva,forwarder)
+
+def read_import_func(image:PEImage)->dict:
+    """
+    Imported function names (or "ord<n>") grouped by DLL.
+    """
+    dll_dict = {}
+    for imp in image.iter_imports():
+        dll_dict.setdefault(imp.dll,[]).append(imp.name or "ord{}".format(imp.ordinal))
+    return dll_dict
+
+def imphash(image:PEImage)->str:
+    """
+    MD5 over the lower case "dll.function" list of the import table,
+    the same scheme as the common imphash. Ordinal imports are written
+    as ord<n> without resolving them to names.
+    """
+    parts = list()
+    for imp in image.iter_imports():
+        dll = imp.dll
+        if dll.rsplit(".",1)[-1] in ("dll","ocx","sys"):
+            dll = dll.rsplit(".",1)[0]
+        parts.append("{}.{}".format(dll,(imp.name or "ord{}".format(imp.ordinal)).lower()))
+    return hashlib.md5(",".join(parts).encode("ascii","replace")).hexdigest() if parts else None
+
+def pe_record(fname:str)->dict:
+    """
+    One triage record of @fname: file and optional header fields,
+    sections and the non empty data directories. Files that cannot be
+    parsed give a record with "error" set instead.
+    """
+    record = {"file":fname,"error":None}
+    try:
+        record["size"] = os.path.getsize(fname)
+        with PEImage(fname) as image:
+            headers = image.headers
+            data_dirs = image.data_dirs
+            opt = headers.optional
+            imports = _import_summary(image)
+    except (OSError,PEFormatError) as err:
+        record["error"] = str(err)
+        return record
+    record.update({"machine":headers.file.machine,
+        "timestamp":headers.file.time_date_stamp,
+        "characteristics":headers.file.characteristics,
+        "magic":opt.magic if opt else None,
+        "entry_point":opt.entry_point if opt else None,
+        "image_base":opt.image_base if opt else None,
+        "subsystem":opt.subsystem if opt else None,
+        "sections":[{"name":section_name(sec),"virtual_address":sec.virtual_address,
+            "virtual_size":sec.virtual_size,"raw_offset":sec.raw_offset,
+            "raw_size":sec.raw_size,"characteristics":sec.characteristics}
+            for sec in headers.sections],
+        "data_dirs":{DATA_DIR_NAMES[i]:list(data_dir) for i, data_dir in enumerate(data_dirs)
+            if data_dir.rva or data_dir.size}})
+    record.update(imports)
+    return record
+
+def _import_summary(image:PEImage)->dict:
+    """
+    Import and export part of pe_record(). A broken table is reported
+    in "import_error" and does not discard the header fields.
+    """
+    summary = {"imphash":None,"import_dlls":[],"num_imports":0,"num_exports":0,
+            "import_error":None}
+    try:
+        dlls = set()
+        for imp in image.iter_imports():
+            dlls.add(imp.dll)
+            summary["num_imports"] += 1
+        for imp in image.iter_delay_imports():
+            dlls.add(imp.dll)
+            summary["num_imports"] += 1
+        summary["import_dlls"] = sorted(dlls)
+        summary["num_exports"] = sum(1 for exp in image.iter_exports())
+        summary["imphash"] = imphash(image)
+    except PEFormatError as err:
+        summary["import_error"] = str(err)
+    return summary
+
+def iter_pe_files(paths:list,list_file:str=None):
+    """
+    Yields every file given in @paths, walking directories recursively,
+    followed by the paths listed one per line in @list_file.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root,name)
+        else:
+            yield path
+    if list_file is not None:
+        with open(list_file,"r") as fd:
+            for line in fd:
+                if line.strip():
+                    yield line.strip()
+
+def file_digest(fname:str)->str:
+    digest = hashlib.sha256()
+    with open(fname,"rb") as fd:
+        for block in iter(lambda:fd.read(1 << 20),b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _record_json(record:dict)->str:
+    """
+    JSON of @record without its "file" key, the form kept in PECache.
+    """
+    return json.dumps({k:v for k, v in record.items() if k != "file"},separators=(",",":"))
+
+def _with_file(fname:str,record_json:str)->str:
+    return '{{"file":{},{}'.format(json.dumps(fname),record_json[1:])
+
+def _hash_batch(fnames:list)->list:
+    """
+    First worker stage of a cached triage(): (file, key) per file, key
+    is (size, mtime_ns, sha256) for PECache or None if unreadable.
+    """
+    results = list()
+    for fname in fnames:
+        try:
+            st = os.stat(fname)
+            results.append((fname,(st.st_size,st.st_mtime_ns,file_digest(fname))))
+        except OSError:
+            results.append((fname,None))
+    return results
+
+def _triage_batch(fnames:list)->list:
+    """
+    Worker of triage(): (file, record JSON, error) per file of the batch.
+    """
+    results = list()
+    for fname in fnames:
+        try:
+            record = pe_record(fname)
+        except Exception as err:
+            # a parser bug on one file must not take down the batch or the pool
+            record = {"file":fname,"error":"{}: {}".format(type(err).__name__,err)}
+        results.append((fname,_record_json(record),record["error"]))
+    return results
+
+def _batches(fnames,size:int):
+    batch = list()
+    for fname in fnames:
+        batch.append(fname)
+        if len(batch) >= size:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (sha256 TEXT PRIMARY KEY, record TEXT NOT NULL,
+    error TEXT, accessed REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS paths (path TEXT PRIMARY KEY, size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL, sha256 TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS records_accessed ON records(accessed);
+"""
+
+class PECache(object):
+    """
+    SQLite cache of triage records. A record is stored once per content
+    hash and every path maps to the hash it had at a given size and
+    mtime, so an unchanged file costs one stat() and one lookup.
+    """
+    def __init__(self:object,db_path:str)->None:
+        self.db = sqlite3.connect(db_path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != RECORD_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS records")
+            self.db.execute("DROP TABLE IF EXISTS paths")
+            self.db.execute("PRAGMA user_version = {}".format(RECORD_VERSION))
+            self.db.commit()
+        self.db.executescript(CACHE_SCHEMA)
+        self.touched = list()
+        self.hits = 0
+        self.hash_hits = 0
+        self.misses = 0
+
+    def lookup(self:object,fname:str)->tuple:
+        """
+        :return: cached (record JSON, error) of @fname if its size and
+        mtime did not change, else None
+        """
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return None
+        row = self.db.execute("SELECT r.sha256, r.record, r.error FROM paths p JOIN records r "
+                "ON p.sha256 = r.sha256 WHERE p.path = ? AND p.size = ? AND p.mtime_ns = ?",
+                (fname,st.st_size,st.st_mtime_ns)).fetchone()
+        if row is None:
+            return None
+        self.hits += 1
+        self.touched.append(row[0])
+        return row[1], row[2]
+
+    def lookup_hash(self:object,fname:str,key:tuple)->tuple:
+        """
+        Content hash lookup of a file whose path entry is stale or
+        missing. A hit maps @fname to the record, so the next run takes
+        the lookup() fast path.
+        :return: cached (record JSON, error) or None
+        """
+        size, mtime_ns, sha256 = key
+        row = self.db.execute("SELECT record, error FROM records WHERE sha256 = ?",(sha256,)).fetchone()
+        if row is None:
+            return None
+        self.hash_hits += 1
+        self.touched.append(sha256)
+        self.db.execute("INSERT OR REPLACE INTO paths VALUES (?,?,?,?)",
+                (fname,size,mtime_ns,sha256))
+        return row[0], row[1]
+
+    def store(self:object,fname:str,key:tuple,record_json:str,error:str)->None:
+        size, mtime_ns, sha256 = key
+        self.misses += 1
+        self.db.execute("INSERT OR REPLACE INTO records VALUES (?,?,?,?)",
+                (sha256,record_json,error,time.time()))
+        self.db.execute("INSERT OR REPLACE INTO paths VALUES (?,?,?,?)",
+                (fname,size,mtime_ns,sha256))
+
+    def commit(self:object)->None:
+        if self.touched:
+            now = time.time()
+            self.db.executemany("UPDATE records SET accessed = ? WHERE sha256 = ?",
+                    ((now,sha256) for sha256 in self.touched))
+            self.touched = list()
+        self.db.commit()
+
+    def evict(self:object,max_age:float=None,max_records:int=None)->int:
+        """
+        Drops records not used for @max_age seconds and all but the
+        @max_records most recently used ones, with their paths.
+        :return: number of records dropped
+        """
+        self.commit()
+        before = self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if max_age is not None:
+            self.db.execute("DELETE FROM records WHERE accessed < ?",(time.time()-max_age,))
+        if max_records is not None:
+            self.db.execute("DELETE FROM records WHERE sha256 NOT IN (SELECT sha256 FROM records "
+                    "ORDER BY accessed DESC LIMIT ?)",(max_records,))
+        self.db.execute("DELETE FROM paths WHERE sha256 NOT IN (SELECT sha256 FROM records)")
+        after = self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        self.db.commit()
+        return before-after
+
+    def report(self:object)->dict:
+        total = self.hits+self.hash_hits+self.misses
+        return {"hits":self.hits,"hash_hits":self.hash_hits,"misses":self.misses,
+                "records":self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0],
+                "hit_rate":(self.hits+self.hash_hits)/total if total else 0.0}
+
+    def close(self:object)->None:
+        self.commit()
+        self.db.close()
+
+def triage(fnames,out_file:str,jobs:int=None,batch:int=TRIAGE_BATCH,cache:PECache=None)->dict:
+    """
+    Parses all @fnames in a process pool and writes one JSON record per
+    file to @out_file (- for stdout) in input order. Errors are reported
+    and recorded but never stop the run. With @cache, unchanged paths
+    are not sent to the pool at all, the others are hashed first and
+    only parsed when their content hash is not cached either.
+    :return: files, errors, seconds and files_per_s of the run
+    """
+    jobs = jobs or os.cpu_count() or 1
+    out = sys.stdout if out_file == "-" else open(out_file,"w")
+    files, errors = 0, 0
+    start = time.perf_counter()
+
+    def parse(pool,fnames_batch:list,done:dict,keys:dict)->tuple:
+        misses = [fname for fname in fnames_batch if fname not in done]
+        future = pool.submit(_triage_batch,misses) if misses else None
+        return fnames_batch,done,keys,future
+
+    def lookup_hashes(pool,fnames_batch:list,done:dict,future)->tuple:
+        """
+        Second stage: cached records found by content hash join @done,
+        the remaining files go to the pool for parsing.
+        """
+        keys = {}
+        for fname, key in future.result() if future is not None else ():
+            if key is None:
+                continue
+            keys[fname] = key
+            found = cache.lookup_hash(fname,key)
+            if found is not None:
+                done[fname] = found
+        return parse(pool,fnames_batch,done,keys)
+
+    def collect(fnames_batch:list,done:dict,keys:dict,future)->None:
+        nonlocal files, errors
+        results = {fname:(record_json,err) for fname, record_json, err in
+                (future.result() if future is not None else ())}
+        lines = list()
+        for fname in fnames_batch:
+            if fname in done:
+                record_json, err = done[fname]
+            else:
+                record_json, err = results[fname]
+                if cache is not None and fname in keys:
+                    cache.store(fname,keys[fname],record_json,err)
+            if err is not None:
+                errors += 1
+                print("[-] {}: {}".format(fname,err),file=sys.stderr)
+            lines.append(_with_file(fname,record_json))
+        out.write("\n".join(lines)+"\n")
+        files += len(lines)
+        if cache is not None:
+            cache.commit()
+
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            hashing = deque()
+            parsing = deque()
+            for fnames_batch in _batches(fnames,batch):
+                if cache is None:
+                    parsing.append(parse(pool,fnames_batch,{},{}))
+                else:
+                    done = {}
+                    for fname in fnames_batch:
+                        found = cache.lookup(fname)
+                        if found is not None:
+                            done[fname] = found
+                    misses = [fname for fname in fnames_batch if fname not in done]
+                    future = pool.submit(_hash_batch,misses) if misses else None
+                    hashing.append((fnames_batch,done,future))
+                    if len(hashing) >= jobs:
+                        parsing.append(lookup_hashes(pool,*hashing.popleft()))
+                if len(parsing) >= 2*jobs:
+                    collect(*parsing.popleft())
+            while hashing:
+                parsing.append(lookup_hashes(pool,*hashing.popleft()))
+            while parsing:
+                collect(*parsing.popleft())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter()-start
+    return {"files":files,"errors":errors,"seconds":elapsed,
+            "files_per_s":files/elapsed if elapsed else 0.0}
 
 def read_file(fname:str)->str:
     with open(fname,"rb") as f_ptr:
         fcontent = f_ptr.read()
     return fcontent
 
+def show_dos_hdr(dos:DosHeader)->None:
+    print("Magic-Byte of DOS-Header: {}".format(struct.unpack('<H',dos.magic)[0]))
+    print("bytes of last page: {}".format(dos.bytes_last_page))
+    print("pages in file: {}".format(dos.pages_in_file))
+    print("number of relocations: {}".format(dos.relocations))
+    print("DOS header size: {}".format(dos.header_paragraphs))
+    print("minimum paragraphs: {}".format(dos.min_alloc))
+    print("maximum paragraphs: {}".format(dos.max_alloc))
+    print("stack modul: {}".format(dos.init_ss))
+    print("stack pointer register: {}".format(dos.init_sp))
+    print("check sum: {}".format(dos.checksum))
+    print("instruction pointer register: {}".format(dos.init_ip))
+    print("code modul: {}".format(dos.init_cs))
+    print("offset first relocation: {}".format(dos.reloc_offset))
+    print("Portable Excutable Header offset: {}".format(dos.pe_offset))
+
+def show_sec_hdr(sec:SectionHeader)->None:
+    print("Section name: {}".format(section_name(sec)))
+    print("Physical Address: {}, in hex: {}".format(sec.virtual_size,hex(sec.virtual_size)))
+    print("Virtual Size: {}, in hex: {}".format(sec.virtual_size,hex(sec.virtual_size)))
+    print("Size of Raw Data: {}, in hex: {}".format(sec.raw_size,hex(sec.raw_size)))
+    print("Virtual Address: {}, in hex: {}".format(sec.virtual_address,hex(sec.virtual_address)))
+    print("Characteristics: {}, in hex: {}".format(sec.characteristics,hex(sec.characteristics)))
+
+def show_imports(image:PEImage)->None:
+    for imp in image.iter_imports():
+        print("Import: {} {} IAT {}".format(imp.dll,imp.name or "ordinal {}".format(imp.ordinal),
+            hex(imp.iat_rva)))
+    for imp in image.iter_delay_imports():
+        print("Delay import: {} {} IAT {}".format(imp.dll,imp.name or "ordinal {}".format(imp.ordinal),
+            hex(imp.iat_rva)))
+    for bound in image.iter_bound_imports():
+        print("Bound import: {} time date stamp {}".format(bound.dll,bound.time_date_stamp))
+    for exp in image.iter_exports():
+        print("Export: ordinal {} {} {}".format(exp.ordinal,exp.name or "-",
+            "-> {}".format(exp.forwarder) if exp.forwarder else hex(exp.rva)))
+    print("Imphash: {}".format(imphash(image)))
+
+def show_pe_hdr(file_hdr:FileHeader)->None:
+    if file_hdr.machine in MACHINE_NAMES:
+        print("Machine: {}".format(MACHINE_NAMES[file_hdr.machine]))
+    else:
+        print("Machine type not found!")
+    print("Number of sections: {}".format(file_hdr.num_sections))
+    print("time date stampe: {}".format(file_hdr.time_date_stamp))
+    print("Symbol table: {}".format(file_hdr.sym_table))
+    print("Number of symbols: {}".format(file_hdr.num_symbols))
+    print("Size of optional header: {}".format(file_hdr.size_opt_hdr))
 
 def read_dos_hdr(dos_hdr:str)->str:
-    if dos_hdr[0:2] == b'MZ':
-        mag_num = struct.unpack('H',dos_hdr[0:2])[0]
-        print("Magic-Byte of DOS-Header: {}".format(mag_num))
-        bytes_last_page = struct.unpack('H',dos_hdr[2:4])[0]
-        print("bytes of last page: {}".format(bytes_last_page))
-        pg_file = struct.unpack('H',dos_hdr[4:6])[0]
-        print("pages in file: {}".format(pg_file))
-        num_rel = struct.unpack("H",dos_hdr[6:8])[0]
-        print("number of relocations: {}".format(num_rel))
-        dos_hdr_sz = struct.unpack('H',dos_hdr[8:10])[0]
-        print("DOS header size: {}".format(dos_hdr_sz))
-        min_par = struct.unpack("H",dos_hdr[10:12])[0]
-        print("minimum paragraphs: {}".format(min_par))
-        max_par = struct.unpack("H",dos_hdr[12:14])[0]
-        print("maximum paragraphs: {}".format(max_par))
-        st_mod = struct.unpack("H",dos_hdr[14:16])[0]
-        print("stack modul: {}".format(st_mod))
-        sp_reg = struct.unpack("H",dos_hdr[16:18])[0]
-        print("stack pointer register: {}".format(sp_reg))
-        chk_sum = struct.unpack("H",dos_hdr[18:20])[0]
-        print("check sum: {}".format(chk_sum))
-        ip_reg = struct.unpack("H",dos_hdr[20:22])[0]
-        print("instruction pointer register: {}".format(ip_reg))
-        code_mod = struct.unpack("H",dos_hdr[22:24])[0]
-        print("code modul: {}".format(code_mod))
-        off_rel = struct.unpack("H",dos_hdr[24:26])[0]
-        print("offset first relocation: {}".format(off_rel))
-        pe_hdr_off = struct.unpack("I",dos_hdr[60:64])[0]
-        print("Portable Excutable Header offset: {}".format(pe_hdr_off))
-    return pe_hdr_off
+    dos = parse_dos_hdr(dos_hdr)
+    show_dos_hdr(dos)
+    return dos.pe_offset
 
 def read_sec_hdr(sec_hdr:str)->None:
-    name = b"".join(struct.unpack('8c',sec_hdr[0:8])).decode("ascii")
-    phys_addr = struct.unpack("I",sec_hdr[8:12])[0]
-    virt_sz = struct.unpack("I",sec_hdr[8:12])[0]
-    virt_addr = struct.unpack("I",sec_hdr[12:16])[0]
-    sz_raw_dat = struct.unpack("I",sec_hdr[16:20])[0]
-    char = struct.unpack("I",sec_hdr[36:40])[0]
-    print("Section name: {}".format(name))
-    print("Physical Address: {}, in hex: {}".format(phys_addr,hex(phys_addr)))
-    print("Virtual Size: {}, in hex: {}".format(virt_sz,hex(virt_sz)))
-    print("Size of Raw Data: {}, in hex: {}".format(sz_raw_dat,hex(sz_raw_dat)))
-    print("Virtual Address: {}, in hex: {}".format(virt_addr,hex(virt_addr)))
-    print("Characteristics: {}, in hex: {}".format(char,hex(char)))
+    show_sec_hdr(_unpack(SEC_HDR,SectionHeader,sec_hdr,0,"section header"))
 
 def read_pe_hdr(pe_hdr:str)->int:
-    machine = hexlify(pe_hdr[0:2]).decode("ascii")
-    if machine == "4c01":
-        print("Machine: i386 32 bit (0x014c)")
-    elif machine == "6486":
-        print("Machine: i386 64 bit (0x8664)")
-    else:
-        print("Machine type not found!")
-    num_sec = struct.unpack("h",pe_hdr[2:4])[0]
-    print("Number of sections: {}".format(num_sec))
-    time_date_stamp = struct.unpack("i",pe_hdr[4:8])[0]
-    print("time date stampe: {}".format(time_date_stamp))
-    sym_tab = struct.unpack('I',pe_hdr[8:12])[0]
-    print("Symbol table: {}".format(sym_tab))
-    num_sym = struct.unpack('I',pe_hdr[12:16])[0]
-    print("Number of symbols: {}".format(num_sym))
-    sizeopthdr = struct.unpack('h',pe_hdr[16:18])[0]
-    chars = bin(int(hex(struct.unpack('H',pe_hdr[18:20])[0]),16))
-    print("Size of optional header: {}".format(sizeopthdr))
-    return sizeopthdr
-
-def read_import_func():
-    dll_dict = {}
+    file_hdr = _unpack(FILE_HDR,FileHeader,pe_hdr,0,"file header")
+    show_pe_hdr(file_hdr)
+    return file_hdr.size_opt_hdr
 
 def read_peopt_hdr(peopt_hdr:str)->str:
     resource_rva = None
@@ -91,105 +844,99 @@ def read_peopt_hdr(peopt_hdr:str)->str:
         print("optional header magic not found")
 
     last_idx = fill_opt_hdr(peopt_hdr)
+    num_rva_sizes = parse_opt_hdr(peopt_hdr,0).num_rva_sizes
+    count = min(num_rva_sizes,(len(peopt_hdr)-last_idx)//DATA_DIR.size)
     image_data_dir = {}
-    init_1 = last_idx
-    init_2 = last_idx+4
-    data_dir = {}
-    data_dir[0] = "Export symbols table"
-    data_dir[1] = "Import symbols table"
-    data_dir[2] = "Resource table"
-    data_dir[3] = "Exception table"
-    data_dir[4] = "Certificate table"
-    data_dir[5] = "Base relocation table"
-    data_dir[6] = "Debugging information"
-    data_dir[7] = "Architecture-specific data"
-    data_dir[8] = "Global pointer register"
-    data_dir[9] = "Thread local storage table"
-    data_dir[10] = "Load configuration table"
-    data_dir[11] = "Bound import table"
-    data_dir[12] = "Import address table"
-    data_dir[13] = "Delay import descriptor"
-    data_dir[14] = "CLR header"
-    data_dir[16] = "Reserved"
-
-    for i in range(0,16):
-        try:
-            rva = struct.unpack('I',peopt_hdr[init_1:init_2])[0]
-            size = struct.unpack('I',peopt_hdr[init_1:int_2+4])[0]
-            image_data_dir[data_dir[i]] = (rva,size)
-            if data_dir[i] == "Resource table":
-                resource_rva = rva
-        except:
-            pass #We are not going to handle execeptional case here
-        init_1 += 8
-        init_2 += 8
+    for i, data_dir in enumerate(parse_data_dirs(peopt_hdr,last_idx,count)):
+        image_data_dir[DATA_DIR_NAMES[i]] = data_dir
+        if DATA_DIR_NAMES[i] == "Resource table":
+            resource_rva = data_dir.rva
 
     return resource_rva
 
 def fill_opt_hdr(peopt_hdr:str)->int:
-    last_idx = 96
-    major_lnkv = struct.unpack('b',bytes([peopt_hdr[2]]))[0]
-    minor_lnkv = struct.unpack('b',bytes([peopt_hdr[3]]))[0]
-    code_size = struct.unpack('i',peopt_hdr[4:8])[0]
-    init_size = struct.unpack('i',peopt_hdr[8:12])[0]
-    uninit_size = struct.unpack('i',peopt_hdr[12:16])[0]
-    entry_point = struct.unpack('i',peopt_hdr[16:20])[0]
-    baseofcode = struct.unpack('i',peopt_hdr[20:24])[0]
-    baseofdata = struct.unpack('i',peopt_hdr[24:28])[0]
-    image_base = struct.unpack('i',peopt_hdr[28:32])[0]
-    sec_alignment = struct.unpack('i',peopt_hdr[32:36])[0]
-    f_alignment = struct.unpack('i',peopt_hdr[36:40])[0]
-    major_op = struct.unpack('h',peopt_hdr[40:42])[0]
-    minor_op = struct.unpack('h',peopt_hdr[42:44])[0]
-    major_im = struct.unpack('h',peopt_hdr[44:46])[0]
-    minor_im = struct.unpack('h',peopt_hdr[46:48])[0]
-    major_subver = struct.unpack('h',peopt_hdr[48:50])[0]
-    minor_subver = struct.unpack('h',peopt_hdr[50:52])[0]
-    win32_verval = struct.unpack('i',peopt_hdr[52:56])[0]
-    sizeofimage = struct.unpack('i',peopt_hdr[56:60])[0]
-    sizeofhdr = struct.unpack('i',peopt_hdr[60:64])[0]
-    chk_sum = struct.unpack('i',peopt_hdr[64:68])[0]
-    sub_sys = struct.unpack('h',peopt_hdr[68:70])[0]
-    dll_chr = bin(int(hex(struct.unpack('h',peopt_hdr[70:72])[0]),16))[2:]
-    sz_stack_reserve = struct.unpack('i',peopt_hdr[72:76])[0]
-    sz_stack_commit = struct.unpack('i',peopt_hdr[76:80])[0]
-    return last_idx
+    return opt_hdr_size(parse_opt_hdr(peopt_hdr,0))
 
 def main():
     description="PE file parsing with Python3"
     epilog="Built by Thi Altenschmidt"
     parser=argparse.ArgumentParser(description=description,epilog=epilog)
-    parser.add_argument("--file","-f",action="store",dest="fname",type=str,
-            help="Specify a PE file for parsing",required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file","-f",action="store",dest="fname",type=str,
+            help="Specify a PE file for parsing")
+    source.add_argument("--dir","-d",action="store",dest="paths",type=str,nargs="+",
+            help="Triage every file below these directories or files.")
+    source.add_argument("--list","-l",action="store",dest="list_file",type=str,
+            help="Triage the files listed one per line in this file.")
+    parser.add_argument("--out","-o",action="store",dest="out_file",type=str,default="pe_triage.jsonl",
+            help="JSON Lines output of the triage mode, - for stdout.")
+    parser.add_argument("--jobs","-j",action="store",dest="jobs",type=int,default=None,
+            help="Number of worker processes of the triage mode.")
+    parser.add_argument("--cache","-c",action="store",dest="cache",type=str,default=None,
+            help="SQLite file caching triage records between runs.")
+    parser.add_argument("--max-age",action="store",dest="max_age",type=float,default=None,
+            help="Evict cached records unused for this many days.")
+    parser.add_argument("--max-records",action="store",dest="max_records",type=int,default=None,
+            help="Keep at most this many cached records.")
+    parser.add_argument("--imports","-i",action="store_true",dest="imports",
+            help="Also list imports and exports of the --file.")
     given_args = parser.parse_args()
+    if given_args.fname is None:
+        if given_args.list_file is not None and not os.path.exists(given_args.list_file):
+            print("[-] File {} doesn't exist!".format(repr(given_args.list_file)))
+            sys.exit(-1)
+        cache = PECache(given_args.cache) if given_args.cache else None
+        try:
+            stats = triage(iter_pe_files(given_args.paths or [],given_args.list_file),
+                    given_args.out_file,given_args.jobs,cache=cache)
+            print("[*] {} files, {} errors in {:.2f}s ({:,.0f} files/s)".format(stats["files"],
+                stats["errors"],stats["seconds"],stats["files_per_s"]),file=sys.stderr)
+            if cache is not None:
+                if given_args.max_age is not None or given_args.max_records is not None:
+                    max_age = given_args.max_age*86400 if given_args.max_age is not None else None
+                    evicted = cache.evict(max_age,given_args.max_records)
+                    print("[*] Evicted {} cached records".format(evicted),file=sys.stderr)
+                report = cache.report()
+                print("[*] Cache: {} hits, {} hash hits, {} parsed, {} records, hit rate {:.1%}".format(
+                    report["hits"],report["hash_hits"],report["misses"],report["records"],
+                    report["hit_rate"]),file=sys.stderr)
+        finally:
+            if cache is not None:
+                cache.close()
+        return
     fname = given_args.fname
     if not os.path.exists(fname):
         print("[-] File {} doesn't exist!".format(repr(fname)))
         sys.exit(-1)
-    f_content = read_file(fname)
-    dos_hdr = f_content[:64]
-    read_dos_hdr(dos_hdr)
-    pe_hdr_off = read_dos_hdr(dos_hdr)
-    pe_hdr = f_content[pe_hdr_off+4:pe_hdr_off+4+20]
-    read_pe_hdr(pe_hdr)
-    sizeopthdr = read_pe_hdr(pe_hdr)
-    peopt_hdr = f_content[pe_hdr_off+4+20:pe_hdr_off+4+20+sizeopthdr]
-    resource_rva = read_peopt_hdr(peopt_hdr)
-    begin_sec = pe_hdr_off+4+20+sizeopthdr
-    end_sec = pe_hdr_off+4+20+sizeopthdr+40
-    num_sec = struct.unpack('h',pe_hdr[2:4])[0]
-
-    #Read section header
-    for i in range(0,num_sec):
-        sec_hdr = f_content[begin_sec:end_sec]
-        read_sec_hdr(sec_hdr)
-        begin_sec += 40
-        end_sec += 40
-
-    #Entry point pe optional header:
-    read_peopt_hdr(peopt_hdr)
-    entry_point = struct.unpack('i',peopt_hdr[16:20])[0]
-    print("Entry point: {} in hex: {}".format(entry_point,hex(entry_point)))
+    try:
+        image = PEImage(fname)
+    except PEFormatError as err:
+        print("[-] {} is not a valid PE file: {}".format(fname,err))
+        sys.exit(-1)
+    with image:
+        show_dos_hdr(image.dos)
+        show_pe_hdr(image.file)
+
+        #Read section header
+        for sec in image.sections:
+            show_sec_hdr(sec)
+
+        #Data directories of the pe optional header:
+        for i, data_dir in enumerate(image.data_dirs):
+            if data_dir.rva or data_dir.size:
+                offset = image.rva_to_offset(data_dir.rva)
+                print("{}: RVA {}, size {}, file offset {}".format(DATA_DIR_NAMES[i],
+                    hex(data_dir.rva),data_dir.size,hex(offset) if offset is not None else None))
+
+        #Entry point pe optional header:
+        entry_point = image.optional.entry_point
+        print("Entry point: {} in hex: {}".format(entry_point,hex(entry_point)))
+
+        if given_args.imports:
+            try:
+                show_imports(image)
+            except PEFormatError as err:
+                print("[-] Broken import or export table: {}".format(err))
 
     #Size of code = #size of raw data in section .text
 